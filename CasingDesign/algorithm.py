@@ -1,4 +1,4 @@
-from Utilities import unitconverter as units
+from Utilities import unitconverter as units, wellpackage, scenariostore, mylogging
 from CasingDesign import fluids, tubulars, api, stress
 from copy import copy
 from config import *
@@ -14,88 +14,174 @@ def casing_strength(master):
     :type master: Scenario
     """
 
-    for i in range(len(master.md)):
-        master.strength_burst.append(api.burst(master.od[i], master.id[i], master.wpf[i], master.grade[i], master.yp[i],
-                                               coupling_type=master.conn[i], leak=leak_resistance))
-        master.strength_joint.append(api.tensile_joint(master.od[i], master.id[i], master.wpf[i], master.grade[i],
-                                                       master.yp[i], master.conn[i]))
-        master.strength_tensile.append(api.tensile_body(master.od[i], master.id[i], master.yp[i]))
-        master.strength_collapse.append(api.collapse(master.od[i], master.id[i], master.yp[i]))
-        master.strength_collapse_biax.append(api.collapse(master.od[i], master.id[i], master.ypadj[i]))
+    grade, conn = master.grade, master.conn
 
+    # Ratings only change at casing breaks, so rate each run of identical casing once and broadcast it
+    section = np.column_stack((master.od, master.id, master.wpf, master.yp, master.grade_code, master.conn_code))
+    start = np.flatnonzero(np.append(True, np.any(section[1:] != section[:-1], axis=1)))
+    stop = np.append(start[1:], len(master.md))
+    for i, j in zip(start, stop):
+        (master.strength_burst[i:j], master.strength_joint[i:j], master.strength_tensile[i:j],
+         master.strength_collapse[i:j]) = api.ratings(master.od[i], master.id[i], master.wpf[i], grade[i],
+                                                      master.yp[i], conn[i], leak=leak_resistance)
 
-def master_scenario(master, scenarios):
+    master.strength_collapse_biax[:] = api.collapse(master.od, master.id, master.ypadj)
+
+
+def section_ratings(casing):
     """
-    Defines the master scenario which is the worst case for each failure mode
+    Burst, joint, pipe body and collapse ratings of every casing section, rounded the same way as update_casing
 
-    :param master: master scenario
-    :type master: Scenario
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :return: burst (psi), joint (lbf), pipe body (lbf), collapse (psi); one value per section
+    :rtype: tuple
+    """
+    od = np.round(units.from_si(np.asarray(casing.od, dtype=float), 'in'), 1)
+    id = np.round(units.from_si(np.asarray(casing.id, dtype=float), 'in'), 3)
+    yp = np.round(units.from_si(np.asarray(casing.yp, dtype=float), 'psi'), -3)
+    wpf = np.round(units.from_si(np.asarray(casing.wpf, dtype=float), 'lbm/ft'), 1)
+
+    rating = [api.ratings(od[i], id[i], wpf[i], casing.grade[i], yp[i], casing.connection[i], leak=leak_resistance)
+              for i in range(len(od))]
+    return tuple(np.array(column, dtype=float) for column in zip(*rating))
+
+
+def breakpoints(casing, scenarios):
+    """
+    Depths where a load or rating can change slope or jump: casing tops, fluid tops of every scenario, and TD
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
     :param scenarios: scenarios list
     :type scenarios: list
+    :return: sorted unique depths (ft)
+    :rtype: np.ndarray
+    """
+    depth = [np.array([0, total_depth], dtype=float), units.from_si(np.asarray(casing.top, dtype=float), 'ft')]
+    for scenario in scenarios:
+        for column in (scenario.fluid_in, scenario.fluid_out):
+            depth.append(units.from_si(np.asarray(column.top, dtype=float), 'ft'))
+
+    # Round off the unit conversion noise so a top read as 2500 ft stays 2500 ft
+    depth = np.unique(np.round(np.concatenate(depth), 6))
+    return depth[(depth >= 0) & (depth <= total_depth)]
+
+
+def breakpoint_safety(casing, scenarios):
     """
+    Exact minimum safety factors between breakpoints.
+    Within one casing section and one fluid layer the loads are linear in depth and the uniaxial ratings are
+    constant, so the worst case of each interval is at one of its ends; only those are evaluated.
+    Burst uses the Burst scenarios, collapse the Collapse scenarios, and pipe body and joint the Tensile scenarios.
 
-    burst_list = list()
-    collapse_list = list()
-    tension_list = list()
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :return: one record per interval: top and bottom (ft), minimum burst, collapse, tensile and joint SF
+    :rtype: np.recarray
+    """
+    depth = breakpoints(casing, scenarios)
+    top, bottom = depth[:-1], depth[1:]
+    ends = units.to_si(np.stack((top, bottom)), 'ft')
 
+    # Section of each interval, taken at its midpoint so both ends use the casing that spans the interval
+    tops = np.asarray(casing.top, dtype=float)
+    section = np.searchsorted(tops[1:], units.to_si((top + bottom) / 2, 'ft'), side='right')
+    strength_burst, strength_joint, strength_tensile, strength_collapse = section_ratings(casing)
+
+    load = {'Burst': np.zeros(len(top)), 'Collapse': np.zeros(len(top)), 'Tensile': np.zeros(len(top))}
     for scenario in scenarios:
+        pin, pout = fluids.pressure(ends, scenario.fluid_in, scenario.fluid_out)
+        pin, pout = units.from_si(pin, 'psi'), units.from_si(pout, 'psi')
         if scenario.scenario == 'Burst':
-            burst_list.append(scenario)
-        if scenario.scenario == 'Collapse':
-            collapse_list.append(scenario)
-        if scenario.scenario == 'Tensile':
-            tension_list.append(scenario)
-
-    for i in range(len(burst_list[0].md)):
-        shortlist = list()
-        shortlist1 = list()
-        for j in range(len(burst_list)):
-            shortlist.append(burst_list[j].burst[i])
-            shortlist1.append(burst_list[j])
-        jmax = np.argmax(np.array(shortlist))
-        master.burst.append(copy(shortlist1[jmax].burst[i]))
-        master.md.append(copy(shortlist1[jmax].md[i]))
-        master.od.append(copy(shortlist1[jmax].od[i]))
-        master.id.append(copy(shortlist1[jmax].id[i]))
-        master.wpf.append(copy(shortlist1[jmax].wpf[i]))
-        master.grade.append(copy(shortlist1[jmax].grade[i]))
-        master.conn.append(copy(shortlist1[jmax].conn[i]))
-        master.yp.append(copy(shortlist1[jmax].yp[i]))
-
-        shortlist = list()
-        shortlist1 = list()
-        for j in range(len(collapse_list)):
-            shortlist.append(collapse_list[j].collapse[i])
-            shortlist1.append(collapse_list[j])
-        jmax = np.argmax(np.array(shortlist))
-        master.collapse.append(copy(shortlist1[jmax].collapse[i]))
-        master.pin.append(copy(shortlist1[jmax].pin[i]))
-        master.pout.append(copy(shortlist1[jmax].pout[i]))
-        master.axial.append(copy(shortlist1[jmax].axial[i]))
-        master.radial.append(copy(shortlist1[jmax].radial[i]))
-        master.tangential.append(copy(shortlist1[jmax].tangential[i]))
-        master.treal.append(copy(shortlist1[jmax].treal[i]))
-        master.teff.append(copy(shortlist1[jmax].teff[i]))
-        master.scenario = 'Collapse'
-
-        shortlist = list()
-        shortlist1 = list()
-        for scenario in scenarios:
-            shortlist.append(scenario.vonmises[i])
-            shortlist1.append(scenario)
-        jmax = np.argmax(np.array(shortlist))
-        master.vonmises.append(copy(shortlist1[jmax].vonmises[i]))
+            load['Burst'] = np.maximum(load['Burst'], np.max(pin - pout, axis=0))
+        elif scenario.scenario == 'Collapse':
+            load['Collapse'] = np.maximum(load['Collapse'], np.max(pout - pin, axis=0))
+        elif scenario.scenario == 'Tensile':
+            treal = tubulars.tension_real(ends, casing, scenario.fluid_in, scenario.fluid_out, section=section)
+            if scenario.name == 'OMW':
+                treal += units.to_si(mop, 'lbf')
+            load['Tensile'] = np.maximum(load['Tensile'], np.max(units.from_si(treal, 'lbf'), axis=0))
+
+    def safety(strength, applied):
+        sf = np.full(len(applied), np.inf)
+        np.divide(strength, applied, out=sf, where=applied > 0)
+        return sf
+
+    return np.rec.fromarrays((top, bottom, safety(strength_burst[section], load['Burst']),
+                              safety(strength_collapse[section], load['Collapse']),
+                              safety(strength_tensile[section], load['Tensile']),
+                              safety(strength_joint[section], load['Tensile'])),
+                             names=('top', 'bottom', 'burst', 'collapse', 'tensile', 'joint'))
+
+
+def master_scenario(master, scenarios):
+    """
+    Defines the master scenario which is the worst case for each failure mode.
+    Also sets master.governing: for burst, collapse, tension and von Mises, the runs of depth over which one scenario
+    governs, as a record array of top and base (ft) and scenario name.
+
+    :param master: master scenario
+    :type master: Scenario
+    :param scenarios: scenarios list
+    :type scenarios: list
+    """
+
+    burst_list = [scenario for scenario in scenarios if scenario.scenario == 'Burst']
+    collapse_list = [scenario for scenario in scenarios if scenario.scenario == 'Collapse']
+    tension_list = [scenario for scenario in scenarios if scenario.scenario == 'Tensile']
+
+    master.allocate(burst_list[0].md, strength=True)
+    master.scenario = 'Collapse'
+
+    burst_governs = __worst(burst_list, 'burst')
+    for column in ('burst', 'od', 'id', 'wpf', 'yp'):
+        getattr(master, column)[:] = __envelope(burst_list, column, burst_governs)
+    collapse_governs = __worst(collapse_list, 'collapse')
+    for column in ('collapse', 'pin', 'pout', 'axial', 'radial', 'tangential', 'treal', 'teff'):
+        getattr(master, column)[:] = __envelope(collapse_list, column, collapse_governs)
+    vonmises_governs = __worst(scenarios, 'vonmises')
+    master.vonmises[:] = __envelope(scenarios, 'vonmises', vonmises_governs)
+
+    # Grade and connection follow the governing burst scenario, recoded onto labels shared by all of them
+    for labels, codes in (('grades', 'grade_code'), ('conns', 'conn_code')):
+        shared = np.unique(np.concatenate([getattr(scenario, labels) for scenario in burst_list]))
+        recoded = [np.searchsorted(shared, getattr(scenario, labels)).astype(np.int16)[getattr(scenario, codes)]
+                   for scenario in burst_list]
+        setattr(master, labels, shared)
+        setattr(master, codes, np.take_along_axis(np.stack(recoded), burst_governs[np.newaxis], axis=0)[0])
 
     yield_pt_adjust([master])
-    for i in range(len(tension_list[0].md)):
-        shortlist = list()
-        shortlist1 = list()
-        for j in range(len(tension_list)):
-            shortlist.append(tension_list[j].treal[i])
-            shortlist1.append(tension_list[j])
-        jmax = np.argmax(np.array(shortlist))
-        # master.treal[i] = shortlist1[jmax].treal[i]
-        # master.teff[i] = shortlist1[jmax].teff[i]
+
+    # The master keeps the tension of the governing collapse scenario; the largest tension only goes on the map
+    master.governing = {'burst': __runs(burst_list, burst_governs, master.md),
+                        'collapse': __runs(collapse_list, collapse_governs, master.md),
+                        'tension': __runs(tension_list, __worst(tension_list, 'treal'), master.md),
+                        'vonmises': __runs(scenarios, vonmises_governs, master.md)}
+
+
+def __worst(scenarios, column):
+    """Index of the scenario with the largest value at each depth (the first one on ties or NaN)."""
+    if len(scenarios) == 0:
+        return np.zeros(0, dtype=int)
+    return np.argmax(np.stack([getattr(scenario, column) for scenario in scenarios]), axis=0)
+
+
+def __envelope(scenarios, column, index):
+    """Values of the column taken from the scenario at index, at each depth."""
+    values = np.stack([getattr(scenario, column) for scenario in scenarios])
+    return np.take_along_axis(values, index[np.newaxis], axis=0)[0]
+
+
+def __runs(scenarios, index, md):
+    """Run-length encoding of the governing scenario index over the depth grid."""
+    start = np.flatnonzero(np.diff(index, prepend=-1))
+    stop = np.append(start[1:], len(index))
+    names = np.array([str(scenarios[k].name) for k in index[start]], dtype=str)
+    return np.rec.fromarrays([md[start], md[stop - 1], names], dtype=[('top', 'f8'), ('base', 'f8'),
+                                                                        ('scenario', names.dtype)])
 
 
 def stress_state(scenarios):
@@ -107,11 +193,8 @@ def stress_state(scenarios):
     :type scenarios: list
     """
     for scenario in scenarios:
-        for i in range(len(scenario.md)):
-            scenario.axial.append(stress.axial(scenario.od[i], scenario.id[i], scenario.treal[i]))
-            scenario.radial.append(stress.radial(scenario.od[i], scenario.id[i], scenario.pin[i], scenario.pout[i]))
-            scenario.tangential.append(stress.tangential(scenario.od[i], scenario.id[i], scenario.pin[i], scenario.pout[i]))
-            scenario.vonmises.append(stress.von_mises(scenario.radial[i], scenario.tangential[i], scenario.axial[i]))
+        stress.lame(scenario.od, scenario.id, scenario.pin, scenario.pout, scenario.treal,
+                    out=(scenario.axial, scenario.radial, scenario.tangential, scenario.vonmises))
 
 
 def yield_pt_adjust(scenarios):
@@ -123,14 +206,10 @@ def yield_pt_adjust(scenarios):
     :type scenarios: list
     """
     for scenario in scenarios:
-        for i in range(len(scenario.md)):
-            if scenario.scenario == 'Collapse':
-                if scenario.treal[i] >= 0:
-                    scenario.ypadj.append(stress.biaxial_yield(scenario.yp[i], scenario.axial[i], tension=True))
-                else:
-                    scenario.ypadj.append(stress.biaxial_yield(scenario.yp[i], scenario.axial[i], tension=False))
-            else:
-                scenario.ypadj.append(scenario.yp[i])
+        if scenario.scenario == 'Collapse':
+            scenario.ypadj[:] = stress.biaxial_yield(scenario.yp, scenario.axial, tension=scenario.treal >= 0)
+        else:
+            scenario.ypadj[:] = scenario.yp
 
 
 def tension(scenarios, casing):
@@ -145,12 +224,10 @@ def tension(scenarios, casing):
     """
 
     for scenario in scenarios:
-        for depth in scenario.md:
-            treal = tubulars.tension_real(units.to_si(depth, 'ft'), casing, scenario.fluid_in, scenario.fluid_out)
-            if scenario.name == 'OMW':
-                treal += units.to_si(mop, 'lbf')
-            teff = tubulars.tension_eff(treal, units.to_si(depth, 'ft'), casing, scenario.fluid_in, scenario.fluid_out)
-            scenario.treal.append(units.from_si(treal, 'lbf')), scenario.teff.append(units.from_si(teff, 'lbf'))
+        depth = units.to_si(scenario.md, 'ft')
+        overpull = units.to_si(mop, 'lbf') if scenario.name == 'OMW' else 0.
+        treal, teff = tubulars.tension_profile(depth, casing, scenario.fluid_in, scenario.fluid_out, overpull)
+        scenario.treal[:], scenario.teff[:] = units.from_si(treal, 'lbf'), units.from_si(teff, 'lbf')
 
 
 def collapse(scenarios):
@@ -160,16 +237,9 @@ def collapse(scenarios):
 
     :param scenarios: scenarios list
     :type scenarios: list
-    :param safety_factor: SF for collapse
-    :type safety_factor: float
     """
     for scenario in scenarios:
-        # if scenario.scenario == 'Collapse':
-            for i in range(len(scenario.md)):
-                s = scenario.pout[i] - scenario.pin[i]
-                if s < 0:
-                    s = 0
-                scenario.collapse.append(s)
+        scenario.collapse[:] = np.maximum(scenario.pout - scenario.pin, 0.)
 
 
 def burst(scenarios):
@@ -179,16 +249,9 @@ def burst(scenarios):
 
     :param scenarios: scenarios list
     :type scenarios: list
-    :param safety_factor: SF for burst
-    :type safety_factor: float
     """
     for scenario in scenarios:
-        # if scenario.scenario == 'Burst':
-            for i in range(len(scenario.md)):
-                s = scenario.pin[i] - scenario.pout[i]
-                if s < 0:
-                    s = 0
-                scenario.burst.append(s)
+        scenario.burst[:] = np.maximum(scenario.pin - scenario.pout, 0.)
 
 
 def pressure(scenarios):
@@ -200,10 +263,9 @@ def pressure(scenarios):
     :type scenarios: list
     """
     for scenario in scenarios:
-        for depth in scenario.md:
-            pin, pout = fluids.pressure(units.to_si(depth, 'ft'), scenario.fluid_in, scenario.fluid_out)
-            scenario.pin.append(units.from_si(pin, 'psi'))
-            scenario.pout.append(units.from_si(pout, 'psi'))
+        pin, pout = fluids.pressure(units.to_si(scenario.md, 'ft'), scenario.fluid_in, scenario.fluid_out)
+        scenario.pin[:] = units.from_si(pin, 'psi')
+        scenario.pout[:] = units.from_si(pout, 'psi')
 
 
 def update_casing(casing, scenario):
@@ -216,118 +278,298 @@ def update_casing(casing, scenario):
     :param casing: Casing object
     :type casing: tubulars.Casing
     """
-    OD, ID, YP, Conn, Grade, WPF = list(), list(), list(), list(), list(), list()
-    top = np.round(units.from_si(list(copy(casing.top)), 'ft'))
-
-    casing_id = list()
-    j = 1
-    for i in range(len(scenario.md)):
-        if j == len(casing.top):
-            pass
-        elif scenario.md[i] > top[j]:
-            j += 1
-        casing_id.append(j - 1)
-        OD.append(np.round(units.from_si(casing.od[j - 1], 'in'), 1))
-        ID.append(np.round(units.from_si(casing.id[j - 1], 'in'), 3))
-        YP.append(np.round(units.from_si(casing.yp[j - 1], 'psi'), -3))
-        WPF.append(np.round(units.from_si(casing.wpf[j - 1], 'lbm/ft'), 1))
-        Grade.append(casing.grade[j - 1])
-        Conn.append(casing.connection[j - 1])
-
-    scenario.od = OD
-    scenario.id = ID
-    scenario.yp = YP
-    scenario.conn = Conn
-    scenario.wpf = WPF
-    scenario.grade = Grade
-
-
-def update_depth(casing, scenario):
+    top = np.round(units.from_si(np.asarray(casing.top, dtype=float), 'ft'))
+    section = np.searchsorted(top[1:], scenario.md, side='left')
+
+    scenario.od[:] = np.round(units.from_si(np.asarray(casing.od, dtype=float), 'in'), 1)[section]
+    scenario.id[:] = np.round(units.from_si(np.asarray(casing.id, dtype=float), 'in'), 3)[section]
+    scenario.yp[:] = np.round(units.from_si(np.asarray(casing.yp, dtype=float), 'psi'), -3)[section]
+    scenario.wpf[:] = np.round(units.from_si(np.asarray(casing.wpf, dtype=float), 'lbm/ft'), 1)[section]
+    scenario.grade = np.asarray(casing.grade)[section]
+    scenario.conn = np.asarray(casing.connection)[section]
+
+
+def update_depth(casing, scenario, md=None):
     """
     Updates the depth at every 1 ft interval; at casing breaks, pressure calculated on each side (0.01 ft).
-    Updates the scenario object
+    A precomputed grid, e.g. from depth_grid, replaces the 1 ft grid when given.
+    Updates the scenario object and allocates its columns to the new depth grid
 
     :param scenario: Scenario object
     :type scenario: Scenario
     :param casing: Casing object
     :type casing: tubulars.Casing
+    :param md: depth grid (ft)
+    :type md: np.ndarray
     """
 
-    md = list()
-    top = list(copy(casing.top))
-    top.pop(0)
+    if md is not None:
+        scenario.allocate(np.asarray(md, dtype=float))
+        return
+
+    md = np.arange(total_depth + 1, dtype=float)
+    top = np.round(units.from_si(np.asarray(casing.top[1:], dtype=float), 'ft'))
+    top = top[(top >= 0) & (top <= total_depth)]
+
+    scenario.allocate(np.insert(md, np.searchsorted(md, top, side='right'), top + 0.01))
 
-    for i in range(total_depth + 1):
-        md.append(i)
-        try:
-            top[0]
-        except IndexError:
-            pass
-        else:
-            if i == np.round(units.from_si(top[0], 'ft')):
-                md.append(i + 0.01)
-                top.pop(0)
 
-    scenario.md = md
+def depth_grid(casing, scenarios, tolerance=grid_tolerance, max_spacing=500., refine=(0.01, 1., 10.), check=False):
+    """
+    Adaptive depth grid shared by all scenarios.
+    Starts from the breakpoints (casing tops, fluid tops and TD) with points packed around each of them, then bisects
+    every interval where the biaxial adjusted yield point or the von Mises stress of any scenario departs from a
+    straight line by more than the tolerance. Elsewhere the loads are linear and points are only max_spacing apart.
+    With check, the result is also compared with the 1 ft grid and the largest interpolation error is logged; that
+    costs a full evaluation on the 1 ft grid, so it is meant for tuning the tolerance, not for every run.
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param tolerance: interpolation error allowed (psi); None gives the 1 ft grid of update_depth
+    :type tolerance: float
+    :param max_spacing: largest distance between points (ft)
+    :type max_spacing: float
+    :param refine: offsets on each side of every breakpoint (ft); the casing breaks also get the 0.01 ft point
+    :type refine: tuple
+    :param check: verify the interpolation error on the 1 ft grid
+    :type check: bool
+    :return: depth grid (ft)
+    :rtype: np.ndarray
+    """
+
+    if tolerance is None:
+        grid = Scenario()
+        update_depth(casing, grid)
+        return grid.md
+
+    depth = breakpoints(casing, scenarios)
+    top = np.round(units.from_si(np.asarray(casing.top[1:], dtype=float), 'ft'))
+    offset = np.concatenate((-np.asarray(refine), refine))
+    md = np.concatenate((depth, top + 0.01, (depth[:, None] + offset).ravel()))
+    md = np.unique(md[(md >= 0) & (md <= total_depth)])
+
+    def nonlinear(md):
+        trial = list()
+        for scenario in scenarios:
+            trial.append(copy(scenario))
+            trial[-1].allocate(md)
+            update_casing(casing, trial[-1])
+        pressure(trial)
+        tension(trial, casing)
+        stress_state(trial)
+        yield_pt_adjust(trial)
+        return np.vstack([scenario.vonmises for scenario in trial] + [scenario.ypadj for scenario in trial])
+
+    while True:
+        mid = (md[:-1] + md[1:]) / 2
+        value = nonlinear(np.concatenate((md, mid)))
+        error = np.abs(value[:, len(md):] - (value[:, :len(md) - 1] + value[:, 1:len(md)]) / 2)
+        split = np.any(error > tolerance, axis=0) | (np.diff(md) > max_spacing)
+        split &= np.diff(md) > 2 * refine[0]
+        if not np.any(split):
+            break
+        md = np.sort(np.concatenate((md, mid[split])))
+
+    if check is not True:
+        mylogging.alglog.info('Grid: {0} points.'.format(len(md)))
+        return md
+
+    # Re-check the interpolation against the 1 ft grid
+    dense = Scenario()
+    update_depth(casing, dense)
+    exact, value = nonlinear(dense.md), nonlinear(md)
+    worst = max(np.max(np.abs(np.interp(dense.md, md, row) - target)) for row, target in zip(value, exact))
+    if worst > tolerance:
+        mylogging.alglog.warning('Grid: {0:.3g} psi interpolation error, above the {1} psi tolerance.'
+                                 .format(worst, tolerance))
+    mylogging.alglog.info('Grid: {0} points, largest interpolation error {1:.3g} psi.'.format(len(md), worst))
+    return md
 
 
 def get_scenarios(path=root+'/Data/Scenario'):
     """
     Initializes the failure scenarios
 
-    :param path: Directory path to the scenarios
+    :param path: Directory path to the scenarios, a well package file (.npz) or a scenario library (.db)
     :return:
     """
+    if path.endswith('.npz'):
+        return package_scenarios(path)
+    if path.endswith('.db'):
+        return library_scenarios(path)
+
+    # One directory listing per scenario type, in the order the file system returns them
     scenario_list = list()
-    r, d, f = os.walk(path + "/Burst")
+    for kind in ('Burst', 'Collapse', 'Tensile'):
+        for entry in os.scandir(path + '/' + kind):
+            if entry.is_dir():
+                scenario_list.append(Scenario(kind, path + '/' + kind + '/' + entry.name + '/'))
+                scenario_list[-1].name = entry.name
+    return scenario_list
+
+
+def package_scenarios(file):
+    """
+    Failure scenarios of a well package, in the order they were packed
+
+    :param file: well package file path
+    :type file: str
+    :return: scenarios list
+    :rtype: list
+    """
+    return __build(wellpackage.read(file)[2], file)
+
+
+def library_scenarios(file, scenario=None, name=None, tags=()):
+    """
+    Failure scenarios of a scenario library matching every criterion given, e.g. scenario='Burst', tags=('gas-well',)
+
+    :param file: scenario library file path
+    :type file: str
+    :param scenario: scenario type (Burst, Collapse or Tensile)
+    :type scenario: str
+    :param name: scenario name
+    :type name: str
+    :param tags: tags the scenarios must all have
+    :type tags: tuple
+    :return: scenarios list
+    :rtype: list
+    """
+    return __build(scenariostore.select(file, scenario, name, tags), file)
+
 
-    for scenario in r[1]:
-        scenario_list.append(Scenario('Burst', path + '/Burst/' + scenario + '/'))
-        scenario_list[-1].name = scenario
+def import_scenarios(file, path=root+'/Data/Scenario', tags=()):
+    """
+    Adds the scenarios of a scenario directory to a scenario library
+
+    :param file: scenario library file path, created if needed
+    :type file: str
+    :param path: Directory path to the scenarios
+    :type path: str
+    :param tags: tags of the imported scenarios
+    :type tags: tuple
+    :return: scenarios list
+    :rtype: list
+    """
+    scenario_list = get_scenarios(path)
+    scenariostore.write(file, scenario_list, tags, source=path)
+    return scenario_list
 
-    r, d, f = os.walk(path + "/Collapse")
-    for scenario in r[1]:
-        scenario_list.append(Scenario('Collapse', path + '/Collapse/' + scenario + '/'))
-        scenario_list[-1].name = scenario
 
-    r, d, f = os.walk(path + "/Tensile")
-    for scenario in r[1]:
-        scenario_list.append(Scenario('Tensile', path + '/Tensile/' + scenario + '/'))
-        scenario_list[-1].name = scenario
+def __build(records, source):
+    """Scenarios from fluid column records in SI units (see wellpackage.read)."""
+    scenario_list = list()
+    for record in records:
+        scenario = Scenario(record['type'])
+        scenario.name, scenario.path = record['name'], source
+        scenario.fluid_in, scenario.fluid_out = fluids.Fluids(None, True), fluids.Fluids(None, False)
+        for fluid, side in ((scenario.fluid_in, 'inside'), (scenario.fluid_out, 'outside')):
+            data = record[side]
+            fluid.scenario, fluid.file = record['type'], source
+            fluid.set_data(data['top'], data['density'], data['surface_pressure'], data['closed'])
+        scenario_list.append(scenario)
     return scenario_list
 
 
 class Scenario:
+    """
+    Columnar load case: every depth dependent quantity is a float64 column over the depth grid, md (ft).
+    Grade and connection are stored as categorical integer codes into the grades and conns labels.
+    The strength columns are only allocated on the master scenario; they are None on the load scenarios.
+    """
+
+    columns = ('md', 'treal', 'teff', 'pin', 'pout', 'axial', 'radial', 'tangential', 'vonmises', 'od', 'id', 'yp',
+               'ypadj', 'wpf', 'burst', 'collapse')
+    strengths = ('strength_burst', 'strength_collapse', 'strength_collapse_biax', 'strength_tensile', 'strength_joint')
+
+    __slots__ = columns + strengths + ('path', 'scenario', 'name', 'fluid_in', 'fluid_out', 'grades', 'grade_code',
+                                       'conns', 'conn_code', 'governing')
+
     def __init__(self, scenario=None, path=None):
         self.path = path
         self.scenario = scenario
         self.name = None
-        self.md = list()
-        self.treal = list()
-        self.teff = list()
-        self.pin = list()
-        self.pout = list()
-        self.axial = list()
-        self.radial = list()
-        self.tangential = list()
-        self.vonmises = list()
-        self.od = list()
-        self.id = list()
-        self.yp = list()
-        self.ypadj = list()
-        self.conn = list()
-        self.grade = list()
-        self.wpf = list()
-        self.strength_burst = list()
-        self.strength_collapse = list()
-        self.strength_collapse_biax = list()
-        self.strength_tensile = list()
-        self.strength_joint = list()
         self.fluid_in = None
         self.fluid_out = None
-        self.burst = list()
-        self.collapse = list()
+        self.governing = None  # master scenario only: governing scenario runs by failure mode
+        self.allocate(np.empty(0))
 
         if self.path is not None:
             self.fluid_in = fluids.Fluids(self.scenario, True, self.path)
             self.fluid_out = fluids.Fluids(self.scenario, False, self.path)
+
+    def __len__(self):
+        return len(self.md)
+
+    def allocate(self, md, strength=False):
+        """
+        Sets the depth grid and preallocates every other column to its length (NaN until calculated)
+
+        :param md: depth grid (ft)
+        :type md: np.ndarray
+        :param strength: also allocate the strength columns (master scenario)
+        :type strength: bool
+        """
+        size = len(md)
+        for column in self.columns:
+            setattr(self, column, np.full(size, np.nan))
+        for column in self.strengths:
+            setattr(self, column, np.full(size, np.nan) if strength is True else None)
+        self.md[:] = md
+        self.grades, self.grade_code = np.empty(0, dtype=str), np.zeros(size, dtype=np.int16)
+        self.conns, self.conn_code = np.empty(0, dtype=str), np.zeros(size, dtype=np.int16)
+
+    @property
+    def grade(self):
+        return self.grades[self.grade_code]
+
+    @grade.setter
+    def grade(self, values):
+        self.grades, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        self.grade_code = codes.astype(np.int16)
+
+    @property
+    def conn(self):
+        return self.conns[self.conn_code]
+
+    @conn.setter
+    def conn(self, values):
+        self.conns, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        self.conn_code = codes.astype(np.int16)
+
+    @property
+    def stored(self):
+        """Depth columns allocated on this scenario"""
+        return self.columns + (self.strengths if self.strength_burst is not None else ())
+
+    @property
+    def nbytes(self):
+        """Memory held by the depth columns (bytes)"""
+        return sum(getattr(self, column).nbytes for column in self.stored) + \
+            self.grade_code.nbytes + self.conn_code.nbytes
+
+    def take(self, index):
+        """
+        Subset of the scenario at the depth index (slice, boolean mask or integer array)
+
+        :param index: depth index
+        :return: new scenario sharing the fluid columns
+        :rtype: Scenario
+        """
+        subset = copy(self)
+        for column in self.stored + ('grade_code', 'conn_code'):
+            setattr(subset, column, getattr(self, column)[index])
+        return subset
+
+    def copy(self):
+        """
+        Deep copy of the depth columns; the fluid columns are shared.
+
+        :rtype: Scenario
+        """
+        duplicate = copy(self)
+        for column in self.stored + ('grade_code', 'conn_code'):
+            setattr(duplicate, column, getattr(self, column).copy())
+        return duplicate
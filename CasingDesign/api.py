@@ -1,8 +1,7 @@
-from Utilities import mylogging
+from Utilities import connections, mylogging
+from collections import OrderedDict
 from config import *
-import sqlite3
 import numpy as np
-from copy import copy
 
 
 def tensile_joint(od, id, wpf, grade, yp, connection):
@@ -33,6 +32,104 @@ def tensile_joint(od, id, wpf, grade, yp, connection):
     return min([P_jf, P_jp])
 
 
+__ratings = dict()
+
+
+def ratings(od, id, wpf, grade, yp, connection, leak=False):
+    """
+    Burst, joint, pipe body and collapse ratings of one casing section.
+    Memoized per section, so the API 5B lookups run once for each distinct casing.
+
+    :param od: outer diameter (in)
+    :type od: float
+    :param id: inner diameter (in)
+    :type id: float
+    :param wpf: weight per foot (lbm/ft)
+    :type wpf: float
+    :param grade: pipe grade
+    :type grade: str
+    :param yp: yield point (psi)
+    :type yp: float
+    :param connection: connection (STC, LTC, or BTC)
+    :type connection: str
+    :param leak: include leak resistance in the burst rating
+    :type leak: bool
+    :return: burst (psi), joint (lbf), pipe body (lbf), collapse (psi)
+    :rtype: tuple
+    """
+
+    key = (float(od), float(id), float(wpf), str(grade), float(yp), str(connection), bool(leak))
+    try:
+        return __ratings[key]
+    except KeyError:
+        pass
+
+    rating = (burst(od, id, wpf, grade, yp, coupling_type=connection, leak=leak),
+              tensile_joint(od, id, wpf, grade, yp, connection),
+              tensile_body(od, id, yp),
+              collapse(od, id, yp, grade=grade))
+    __ratings[key] = rating
+    return rating
+
+
+def ratings_batch(od, id, wpf, grade, yp, connection, database=root + '/Data/APIspecifications.db'):
+    """
+    Ratings of many casing items in one pass: the API 5B coupling data is gathered into columns, then the burst,
+    joint and pipe body formulas run on whole arrays and collapse on each grade's items. Items without API 5B
+    coupling data get NaN ratings; burst_leak is NaN where the coupling has no leak resistance data.
+
+    :param od: outer diameters (in)
+    :type od: np.ndarray
+    :param id: inner diameters (in)
+    :type id: np.ndarray
+    :param wpf: weights per foot (lbm/ft)
+    :type wpf: np.ndarray
+    :param grade: pipe grades
+    :type grade: np.ndarray
+    :param yp: yield points (psi)
+    :type yp: np.ndarray
+    :param connection: connections (STC, LTC, or BTC)
+    :type connection: np.ndarray
+    :param database: API specifications file path
+    :type database: str
+    :return: burst, burst_leak (psi), joint, tensile (lbf) and collapse (psi) arrays
+    :rtype: dict
+    """
+
+    od, id, wpf, yp = (np.asarray(value, dtype=float) for value in (od, id, wpf, yp))
+    grade, connection = np.asarray(grade, dtype=str), np.asarray(connection, dtype=str)
+    coupling = get_5B_batch(od, wpf, grade, connection, database=database, strict=False)
+    btc = connection == 'BTC'
+    known = ~np.isnan(coupling['D'])
+
+    # Same formulas as burst, tensile_joint and diameter_root, with the coupling type picked per item. The columns
+    # are indexed by name: attribute access would give ndarray.T for the taper
+    W, E1, T, A, tpi = (coupling[name] for name in ('W', 'E1', 'T', 'A', 'tpi'))
+    d1 = np.where(btc, coupling['E7'] - (coupling['L7'] + coupling['I']) * T + 0.062,
+                  E1 - (coupling['L1'] + A / tpi) * T + coupling['H'] - 2 * coupling['Srn'])
+    body = burst_body(od, id, yp)
+    coupled = coupling['yp'] * (W - d1) / W
+    leak = 30e6 * T * A * (W ** 2 - E1 ** 2) / (2 * tpi * E1 * W ** 2)
+
+    up = np.array([ultimate_strength(value, L=False) for value in grade], dtype=float)
+    area = np.pi / 4 * (od ** 2 - id ** 2)
+    fracture = 0.95 * np.where(btc, np.pi / 4 * (W ** 2 - d1 ** 2), area_last_thread(od, id)) * up
+    length = coupling['L4'] - coupling['M']
+    pullout = np.where(btc, 0.95 * area * up * (1.008 - 0.0396 * (1.083 - yp / up) * od),
+                       0.95 * area_last_thread(od, id) * length *
+                       ((0.74 * np.power(od, -0.59) * up) / (0.5 * length + 0.14 * od) + yp / (length + 0.14 * od)))
+
+    rating = {'burst': np.minimum(body, coupled), 'burst_leak': np.minimum(np.minimum(body, coupled), leak),
+              'joint': np.minimum(fracture, pullout), 'tensile': tensile_body(od, id, yp),
+              'collapse': np.full(len(od), np.nan)}
+    for value in np.unique(grade[known]):
+        items = known & (grade == value)
+        rating['collapse'][items] = collapse(od[items], id[items], yp[items], grade=value, database=database)
+    for name in ('burst', 'joint', 'tensile'):
+        rating[name][~known] = np.nan
+    return rating
+
+
 def tensile_body(od, id, yp):
     """
     Tensile strength rating of the pipe body
@@ -223,49 +320,53 @@ def diameter_root(coupling):
     :rtype: float
     """
 
-    if coupling.type is 'BTC':
+    if coupling.type == 'BTC':
         return coupling.E7 - (coupling.L7 + coupling.I) * coupling.T + 0.062
     return coupling.E1 - (coupling.L1 + coupling.A/coupling.tpi) * coupling.T + coupling.H - 2 * coupling.Srn
 
 
-def collapse(od, id, yp):
+def collapse(od, id, yp, grade=None, database=root + '/Data/APIspecifications.db'):
     """
-    Collapse strength
+    Collapse strength. Takes scalars or arrays, which are broadcast against each other; the regime of every element
+    is picked by its D/t ratio, so one call rates a whole depth grid.
 
     :param od: outer diameter (in)
-    :type od: float
+    :type od: float or np.ndarray
     :param id: inner diameter (in)
-    :type id: float
+    :type id: float or np.ndarray
     :param yp: yield point (psi)
-    :type yp: float
+    :type yp: float or np.ndarray
+    :param grade: pipe grade of a rated (not adjusted) yield point, for the API 5C3 table; see coefficients_5C3
+    :type grade: str
+    :param database: API specifications file path, for the API 5C3 table
+    :type database: str
     :return: P_collapse (psi)
-    :rtype: float
+    :rtype: float or np.ndarray
     """
+    od, id, yp = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (od, id, yp)))
     t = (od - id) / 2
     Dt = od / t
 
-    p_ypc = collapse_minimum(od, id, yp)
-    p_pc = collapse_plastic(od, id, yp)
-    p_tc = collapse_transition(od, id, yp)
-    p_ec = collapse_elastic(od, id)
-
-    A = A_5C3_calc(yp)
-    B = B_5C3_calc(yp)
-    C = C_5C3_calc(yp)
-    F = F_5C3_calc(yp)
-    G = G_5C3_calc(yp)
+    # A run has a handful of rated yield points, served from the coefficient cache; adjusted yield points
+    # differ at every depth and go through the formulas in one pass
+    values, inverse = np.unique(yp, return_inverse=True)
+    if len(values) <= __5C3_cached:
+        records = [coefficients_5C3(value, grade, database=database) for value in values]
+        coefficients = [np.array([getattr(record, name) for record in records])[inverse.ravel()].reshape(yp.shape)
+                        for name in __5C3_columns]
+    else:
+        record = __5C3_formulas(yp)
+        coefficients = [getattr(record, name) for name in __5C3_columns]
+    A, B, C, F, G, ratio_plastic, ratio_transition, ratio_elastic = coefficients
 
-    ratio_plastic = (np.sqrt((A - 2) ** 2 + 8 * (B + C / yp)) + A - 2) / (2 * (B + C / yp))
-    ratio_transition = yp * (A - F) / (C + yp * (B - G))
-    ratio_elastic = (2 + B / A) / (3 * B / A)
+    p_ypc = 2 * yp * ((Dt - 1) / Dt ** 2)
+    p_pc = yp * (A / Dt - B) - C
+    p_tc = yp * (F / Dt - G)
+    p_ec = 46950000 / (Dt * (Dt - 1) ** 2)
 
-    if Dt <= ratio_plastic:
-        return p_ypc
-    if Dt <= ratio_transition:
-        return p_pc
-    if Dt <= ratio_elastic:
-        return p_tc
-    return p_ec
+    p_collapse = np.select([Dt <= ratio_plastic, Dt <= ratio_transition, Dt <= ratio_elastic], [p_ypc, p_pc, p_tc],
+                           p_ec)
+    return float(p_collapse) if p_collapse.ndim == 0 else p_collapse
 
 
 def collapse_minimum(od, id, yp):
@@ -301,13 +402,11 @@ def collapse_plastic(od, id, yp):
     :rtype: float
     """
 
-    A = A_5C3_calc(yp)
-    B = B_5C3_calc(yp)
-    C = C_5C3_calc(yp)
+    data = coefficients_5C3(yp)
     t = (od - id) / 2
     Dt = od / t
 
-    return yp * (A / Dt - B) - C
+    return yp * (data.A / Dt - data.B) - data.C
 
 
 def collapse_transition(od, id, yp):
@@ -323,12 +422,11 @@ def collapse_transition(od, id, yp):
     :return: P_yp (psi)
     :rtype: float
     """
-    F = F_5C3_calc(yp)
-    G = G_5C3_calc(yp)
+    data = coefficients_5C3(yp)
     t = (od - id) / 2
     Dt = od / t
 
-    return yp * (F / Dt - G)
+    return yp * (data.F / Dt - data.G)
 
 
 def collapse_elastic(od, id):
@@ -393,8 +491,11 @@ def F_5C3_calc(yp):
     :return: f
     """
 
-    A = A_5C3_calc(yp)
-    B = B_5C3_calc(yp)
+    return __F_5C3(yp, A_5C3_calc(yp), B_5C3_calc(yp))
+
+
+def __F_5C3(yp, A, B):
+    """F from A and B already calculated for the same yield point."""
     X = B / A
     num = 46.95e6 * (3 * X / (2 + X)) ** 3
     den = yp * (3 * X / (2 + X) - X) * (1 - 3 * X / (2 + X)) ** 2
@@ -420,6 +521,9 @@ def G_5C3_calc(yp):
 
 
 class API5B:
+    __slots__ = ('type', 'round', 'D', 'D4', 'W', 'wpf', 'grade', 'yp', 'tpi', 'L1', 'L2', 'L4', 'L7', 'g', 'E1', 'E7',
+                 'Ef', 'J', 'Jn', 'M', 'Q', 'q', 'A', 'A1', 'Lc', 'H', 'I', 'Ibtc', 'T', 'Srn', 'MakeUp')
+
     def __init__(self):
         self.type = None  # STC, LTC, or BTC
         self.round = None  # round is True; buttress is False
@@ -447,182 +551,169 @@ class API5B:
         self.A1 = None  # End of Pipe to Triangle Stamp
         self.Lc = None  # Full Crest Threads from Enf of Pipe Minimum Length
         self.H = None  # Thread height
+        self.I = None  # Buttress thread length to the base of the triangle stamp
         self.Ibtc = None
         self.T = 0.0625  # Taper in/in
         self.Srn = None
         self.MakeUp = 1.0  # Make-up loss of length
 
 
+# Column names in APIspecifications.db for each coupling table, mapped to API5B attributes
+__5B_columns = {'STC': {'D4': 'D4', 'WPF': 'wpf', 'YP': 'grade', 'TPI': 'tpi', 'H': 'H', 'L1': 'L1', 'L2': 'L2',
+                        'L4': 'L4', 'E1': 'E1', 'J': 'J', 'M': 'M', 'Q': 'Q', 'qdepth': 'q', 'A': 'A', 'Lc': 'Lc',
+                        'Srn': 'Srn', 'W': 'W', 'MLR3': 'MakeUp'},
+                'LTC': {'D4': 'D4', 'YP': 'grade', 'TPI': 'tpi', 'H': 'H', 'L1': 'L1', 'L2': 'L2', 'L4': 'L4',
+                        'E1': 'E1', 'J': 'J', 'M': 'M', 'Q': 'Q', 'qdepth': 'q', 'A': 'A', 'Lc': 'Lc', 'Srn': 'Srn',
+                        'W': 'W', 'MLR3': 'MakeUp'},
+                'BTC': {'D4': 'D4', 'TPI': 'tpi', 'g': 'g', 'L7': 'L7', 'L4': 'L4', 'E7': 'E7', 'J': 'J', 'Jn': 'Jn',
+                        'Ef': 'Ef', 'A1': 'A1', 'A': 'A', 'Q': 'Q', 'Lc': 'Lc', 'I': 'I', 'T': 'T', 'W': 'W',
+                        'MLR3': 'MakeUp'}}
+__5C3_columns = ('A', 'B', 'C', 'F', 'G', 'DtLow', 'DtPlastic', 'DtElastic')
+__5C3_coefficients = OrderedDict()
+__5C3_cached = 64  # most distinct yield points in one collapse call served from the coefficient cache
+__5C3_size = 1024  # most yield points kept in the coefficient cache; the least recently used go first
+__specifications = dict()
+__5B_lookup = dict()
+
+
+def load_specifications(database=root + '/Data/APIspecifications.db'):
+    """
+    Loads the API 5B (STC, LTC, BTC) and API 5C3 tables into memory, once per process and database.
+    Coupling tables are float64 structured arrays (missing values are NaN); 5C3 is a dict of API5C3 by grade.
+
+    :param database: database file path
+    :type database: str
+    :return: tables by name
+    :rtype: dict
+    """
+
+    try:
+        return __specifications[database]
+    except KeyError:
+        pass
+
+    tables = dict()
+    for table, columns in __5B_columns.items():
+        names = ['D'] + list(columns.keys())
+        rows = [tuple(np.nan if value is None else float(value) for value in row)
+                for row in connections.query(database, 'SELECT {0} FROM {1}'.format(', '.join(names), table))]
+        tables[table] = np.array(rows, dtype=[(name, 'f8') for name in names])
+
+    tables['API5C3'] = dict()
+    for row in connections.query(database, 'SELECT Grade, {0} FROM API5C3'.format(', '.join(__5C3_columns))):
+        data = API5C3()
+        data.grade = row[0]
+        for name, value in zip(__5C3_columns, row[1:]):
+            setattr(data, name, float(value))
+        tables['API5C3'][row[0]] = data
+
+    __specifications[database] = tables
+    return tables
+
+
 def get_5B_data(od, weight, grade, coupling_type, database=root + '/Data/APIspecifications.db'):
     """
-    Gets API 5B specification data for casing couplings.
+    Gets API 5B specification data for casing couplings from the in-memory tables.
+    Records are shared between calls and must not be modified.
 
     :param od: outer diameter, OD (in)
     :type od: float
     :param weight: weight per foot, WPF (lbf/ft)
     :type weight: float
-    :param grade: pipe grade yield point
-    :type grade: int
+    :param grade: pipe grade
+    :type grade: str
     :param coupling_type: coupling type STC, LTC, or BTC
     :type coupling_type: str
     :param database: database file path
     :type database: str
-    :return: 5C3 class object for the grade
+    :return: 5B class object for the coupling
     :rtype: API5B
     """
 
+    key = (float(od), str(coupling_type), float(np.round(weight, 2)), str(grade), database)
+    try:
+        return __5B_lookup[key]
+    except KeyError:
+        pass
+
+    if coupling_type not in ('STC', 'BTC'):
+        coupling_type = 'LTC'
+    table = load_specifications(database)[coupling_type]
+    rows = table[table['D'] == od]
+    if len(rows) == 0:
+        print('DATABASE: Coupling does not exist in API 5B.')
+        raise IndexError('DATABASE: Coupling does not exist in API 5B.')
+
+    yp = float(grade.split('-')[1]) * 1000
+    if coupling_type == 'STC':
+        # A row with a preferred weight wins; otherwise the rows without one, or every row if they all have one
+        preferred = rows[rows['WPF'] == np.round(weight, 2)]
+        general = rows[np.isnan(rows['WPF'])]
+        rows = preferred if len(preferred) > 0 else general if len(general) > 0 else rows
+    if coupling_type != 'BTC':
+        # Rows with a minimum grade (1000 psi) apply from that grade up; pick the highest one that applies
+        minimum = np.nan_to_num(rows['YP'], nan=0.)
+        applies = np.flatnonzero(minimum <= yp / 1000)
+        rows = rows[applies[np.argmax(minimum[applies])]] if len(applies) > 0 else rows[0]
+    else:
+        rows = rows[0]
+
     data = API5B()
     data.D = od
     data.wpf = weight
-    data.type = coupling_type
+    data.type = str(coupling_type)
     data.grade = grade
-    data.yp = float(grade.split('-')[1]) * 1000
+    data.yp = yp
+    for column, attribute in __5B_columns[coupling_type].items():
+        if column == 'YP' or np.isnan(rows[column]):
+            continue
+        setattr(data, attribute, int(rows[column]) if attribute == 'tpi' else float(rows[column]))
 
-    try:
-        (cursor, conn) = open_database(database)
-    except FileNotFoundError:
-        raise FileNotFoundError
-    except sqlite3.InterfaceError:
-        raise FileNotFoundError
-
-    if data.type == 'STC':
-        cursor.execute('SELECT D4, WPF, YP, TPI, H, L1, L2, L4, E1, J, M, Q, qdepth, A, Lc, Srn, W, MLR3 FROM STC WHERE D=?', [data.D])
-    elif data.type == 'BTC':
-        cursor.execute('SELECT D4, TPI, g, L7, L4, E7, J, Jn, Ef, A1, A, Q, Lc, I, T, W, MLR3 FROM BTC WHERE D=?', [data.D])
-    else:
-        cursor.execute('SELECT D4, YP, TPI, H, L1, L2, L4, E1, J, M, Q, qdepth, A, Lc, Srn, W, MLR3 FROM LTC WHERE D=?', [data.D])
+    __5B_lookup[key] = data
+    return data
 
-    try:
-        constants = cursor.fetchall()
-    except IndexError:
-        print('DATABASE: Coupling does not exist in API 5B.')
-        close_database(cursor, conn)
-        raise IndexError('DATABASE: Coupling does not exist in API 5B.')
 
-    close_database(cursor, conn)
-
-    if data.type == 'STC':
-        yp_check = False
-        if len(constants) is not 1:
-            yp_check = False
-            for i in range(len(constants)):
-                if constants[i][1] == np.round(weight, 2):
-                    constants = constants[i]
-                    break
-                else:
-                    yp_check = True
-        else:
-            constants = constants[0]
-
-        if yp_check is True:
-            j = None
-            pop_j = False
-            for i in range(len(constants)):
-                if constants[i][1] is not None:
-                    j = copy(i)
-                    pop_j = True
-            if pop_j is True:
-                constants.pop(j)
-
-            if constants[0][2] is None:
-                if grade >= constants[1][2]:
-                    constants = constants[1]
-                else:
-                    constants = constants[0]
-            elif grade >= constants[0][2]:
-                constants = constants[0]
-            else:
-                constants = constants[1]
-
-        data.D4 = float(constants[0])
-        try:
-            data.wpf = float(constants[1])
-        except TypeError:
-            pass
-        try:
-            data.yp = int(constants[2])
-        except TypeError:
-            pass
-        try:
-            data.tpi = int(constants[3])
-        except TypeError:
-            pass
-        data.H = float(constants[4])
-        data.L1 = float(constants[5])
-        data.L2 = float(constants[6])
-        data.L4 = float(constants[7])
-        data.E1 = float(constants[8])
-        data.J = float(constants[9])
-        data.M = float(constants[10])
-        data.Q = float(constants[11])
-        data.q = float(constants[12])
-        data.A = float(constants[13])
-        data.Lc = float(constants[14])
-        data.Srn = float(constants[15])
-        data.W = float(constants[16])
-        data.MakeUp = float(constants[17])
-
-    if data.type == 'LTC':
-        if len(constants) is not 1:
-            if constants[0][1] is None:
-                if grade >= constants[1][1]:
-                    constants = constants[1]
-                else:
-                    constants = constants[0]
-            elif grade >= constants[0][1]:
-                constants = constants[0]
-            else:
-                constants = constants[1]
-        else:
-            constants = constants[0]
-
-        data.D4 = float(constants[0])
-        try:
-            data.yp = int(constants[1])
-        except TypeError:
-            pass
+def get_5B_batch(od, weight, grade, coupling_type, database=root + '/Data/APIspecifications.db', strict=True):
+    """
+    API 5B coupling data for a whole inventory in one call
+
+    :param od: outer diameters, OD (in)
+    :type od: np.ndarray
+    :param weight: weights per foot, WPF (lbf/ft)
+    :type weight: np.ndarray
+    :param grade: pipe grades
+    :type grade: np.ndarray
+    :param coupling_type: coupling types STC, LTC, or BTC
+    :type coupling_type: np.ndarray
+    :param database: database file path
+    :type database: str
+    :param strict: raise for an item without coupling data; otherwise its record is all NaN
+    :type strict: bool
+    :return: one record per item; attributes of API5B as columns (NaN where not applicable)
+    :rtype: np.recarray
+    """
+
+    names = [name for name in API5B.__slots__ if name not in ('type', 'round', 'grade')]
+    records = list()
+    for item in zip(od, weight, grade, coupling_type):
         try:
-            data.tpi = int(constants[2])
-        except TypeError:
-            pass
-        data.H = float(constants[3])
-        data.L1 = float(constants[4])
-        data.L2 = float(constants[5])
-        data.L4 = float(constants[6])
-        data.E1 = float(constants[7])
-        data.J = float(constants[8])
-        data.M = float(constants[9])
-        data.Q = float(constants[10])
-        data.q = float(constants[11])
-        data.A = float(constants[12])
-        data.Lc = float(constants[13])
-        data.Srn = float(constants[14])
-        data.W = float(constants[15])
-        data.MakeUp = float(constants[16])
-
-    if data.type == 'BTC':
-        data.D4 = float(constants[0][0])
-        data.tpi = int(constants[0][1])
-        data.g = float(constants[0][2])
-        data.L7 = float(constants[0][3])
-        data.L4 = float(constants[0][4])
-        data.E7 = float(constants[0][5])
-        data.J = float(constants[0][6])
-        data.Jn = float(constants[0][7])
-        data.Ef = float(constants[0][8])
-        data.A1 = float(constants[0][9])
-        data.A = float(constants[0][10])
-        data.Q = float(constants[0][11])
-        data.Lc = float(constants[0][12])
-        data.I = float(constants[0][13])
-        data.T = float(constants[0][14])
-        data.W = float(constants[0][15])
-        data.MakeUp = float(constants[0][16])
+            data = get_5B_data(*item, database=database)
+        except IndexError:
+            if strict is True:
+                raise
+            records.append((np.nan,) * len(names))
+            continue
+        records.append(tuple(np.nan if getattr(data, name) is None else float(getattr(data, name))
+                             for name in names))
 
-    return data
+    batch = np.rec.fromrecords(records, names=names) if len(records) > 0 else \
+        np.recarray(0, dtype=[(name, 'f8') for name in names])
+    return batch
 
 
 class API5C3:
+    __slots__ = ('grade', 'A', 'B', 'C', 'F', 'G', 'DtLow', 'DtPlastic', 'DtElastic')
+
     def __init__(self):
         self.grade = None
         self.A = None
@@ -637,7 +728,7 @@ class API5C3:
 
 def get_5C3_data(grade, database=root + '/Data/APIspecifications.db'):
     """
-    Gets API 5C3 specification data
+    Gets API 5C3 specification data from the in-memory table
 
     :param grade: pipe grade
     :type grade: str
@@ -648,48 +739,67 @@ def get_5C3_data(grade, database=root + '/Data/APIspecifications.db'):
     """
 
     try:
-        (cursor, conn) = open_database(database)
-    except FileNotFoundError:
-        raise FileNotFoundError
-    except sqlite3.InterfaceError:
-        raise FileNotFoundError
-
-    cursor.execute('SELECT A, B, C, F, G, DtLow, DtPlastic, DtElastic FROM API5C3 WHERE Grade=?', [grade])
-
-    try:
-        constants = cursor.fetchall()[0]
-    except IndexError:
+        return load_specifications(database)['API5C3'][grade]
+    except KeyError:
         print('DATABASE: {0} grade does not exist in API 5C3.'.format(grade))
         raise IndexError('DATABASE: {0} grade does not exist in API 5C3.'.format(grade))
 
-    close_database(cursor, conn)
-
-    data = API5C3()
-    data.grade = grade
-    data.A, data.B, data.C, data.F, data.G = constants[0], constants[1], constants[2], constants[3], constants[4]
-    data.DtLow, data.DtPlastic, data.DtElastic = constants[5], constants[6], constants[7]
-    return data
 
+def coefficients_5C3(yp, grade=None, table=collapse_table, database=root + '/Data/APIspecifications.db'):
+    """
+    API 5C3 collapse coefficients and D/t limits of one yield point, calculated once and then served from memory.
+    The cache keeps the most recently used yield points, so adjusted yield points from sessions and optimizer runs
+    do not grow it without bound. With table, the values of the grade are read from the API 5C3 table instead;
+    adjusted yield points have no grade and always use the formulas. Records are shared between calls and must not
+    be modified.
 
-def open_database(file=None):
-    if file is None:
-        mylogging.runlog.error('DATABASE: Missing file input.')
-        raise FileNotFoundError('DATABASE: Missing file input.')
+    :param yp: yield point (psi)
+    :type yp: float
+    :param grade: pipe grade, only used with table
+    :type grade: str
+    :param table: use the API 5C3 table values of the grade
+    :type table: bool
+    :param database: database file path
+    :type database: str
+    :return: A, B, C, F, G and the yield/plastic (DtLow), plastic/transition (DtPlastic) and transition/elastic
+             (DtElastic) D/t limits
+    :rtype: API5C3
+    """
 
-    mylogging.runlog.info('DATABASE: Opening {0} database.'.format(file))
+    table = table is True and grade is not None
+    key = (float(yp), str(grade), database) if table else (float(yp), None, None)
     try:
-        conn = sqlite3.connect(file)
-    except sqlite3.InterfaceError:
-        mylogging.runlog.error('DATABASE: Database interface error.')
-        raise sqlite3.InterfaceError
-    else:
-        cursor = conn.cursor()
-        mylogging.runlog.info('DATABASE: Database {0} opened.'.format(file))
-        return cursor, conn
+        __5C3_coefficients.move_to_end(key)
+        return __5C3_coefficients[key]
+    except KeyError:
+        pass
 
+    data = None
+    if table:
+        try:
+            data = get_5C3_data(grade, database)
+        except IndexError:
+            mylogging.alglog.info('API 5C3: Formulas used for {0}, which is not in the table.'.format(grade))
+    if data is None:
+        data = __5C3_formulas(np.float64(yp))
+        data.grade = grade
+
+    __5C3_coefficients[key] = data
+    if len(__5C3_coefficients) > __5C3_size:
+        __5C3_coefficients.popitem(last=False)
+    return data
 
-def close_database(cursor, conn):
-    cursor.close()
-    conn.close()
-    mylogging.runlog.info('DATABASE: Database closed.')
 
+def __5C3_formulas(yp):
+    """API 5C3 coefficients and D/t limits from the formulas; yp may be an array."""
+    data = API5C3()
+    A = A_5C3_calc(yp)
+    B = B_5C3_calc(yp)
+    C = C_5C3_calc(yp)
+    F = __F_5C3(yp, A, B)
+    G = F * (B / A)
+    data.A, data.B, data.C, data.F, data.G = A, B, C, F, G
+    data.DtLow = (np.sqrt((A - 2) ** 2 + 8 * (B + C / yp)) + A - 2) / (2 * (B + C / yp))
+    data.DtPlastic = yp * (A - F) / (C + yp * (B - G))
+    data.DtElastic = (2 + B / A) / (3 * B / A)
+    return data
@@ -1,6 +1,6 @@
 from Utilities import unitconverter as units, readfromfile as read, mylogging
-import csv
 from config import *
+import numpy as np
 
 
 def pressure(depth, inside, outside):
@@ -25,34 +25,24 @@ def pressure_single(depth, fluid_column):
     Pressure at a given depth for fluid column
 
     :param depth: depth of interest (m)
-    :type depth: float
+    :type depth: float or np.ndarray
     :param fluid_column: fluid column profile
     :type fluid_column: Fluids
     :return: pressure at depth (Pa)
-    :rtype: float
+    :rtype: float or np.ndarray
     """
 
-    if depth > units.to_si(total_depth, depth_unit):
+    depth = np.asarray(depth, dtype=float)
+    if np.any(depth > fluid_column.td):
         mylogging.alglog.info('Fluids: Depth is greater than TD.')
         print('Fluids: Depth is greater than TD.')
 
-    pressure = fluid_column.surface_pressure
-    i = 0
-    try:
-        bottom = fluid_column.top[i + 1]
-    except IndexError:
-        bottom = units.to_si(total_depth, 'ft')
+    if fluid_column.cumulative is None:
+        fluid_column.compile()
 
-    while bottom < depth:
-        pressure += (bottom - fluid_column.top[i]) * fluid_column.density[i] * units.to_si(1, 'gn')
-        i += 1
-        try:
-            bottom = fluid_column.top[i + 1]
-        except IndexError:
-            bottom = units.to_si(total_depth, depth_unit)
-
-    pressure += (depth - fluid_column.top[i]) * fluid_column.density[i] * units.to_si(1, 'gn')
-    return pressure
+    layer = np.minimum(np.searchsorted(fluid_column.top[1:], depth, side='left'), len(fluid_column.top) - 1)
+    return (fluid_column.cumulative[layer] +
+            (depth - fluid_column.top[layer]) * fluid_column.density[layer] * fluid_column.gn)[()]
 
 
 def hydrostatic(head, density):
@@ -71,6 +61,8 @@ def hydrostatic(head, density):
 
 class Fluids:
     """Converts all inputs to SI units."""
+    __columns = {'Top (TVD)': (float, True), 'Density': (float, True)}
+
     def __init__(self, scenario, inside=True, path=root + '/Data/Scenario/'):
         self.scenario = scenario
         self.inside = inside
@@ -80,6 +72,9 @@ class Fluids:
         self.closed = None
         self.surface_pressure = None
         self.downhole_pressure = None
+        self.td = units.to_si(total_depth, depth_unit)
+        self.gn = units.to_si(1, 'gn')
+        self.cumulative = None
 
         if scenario is not None:
             try:
@@ -87,8 +82,39 @@ class Fluids:
             except KeyError:
                 pass
             else:
+                self.compile()
                 mylogging.runlog.info('Fluids: Populate Fluids object with tubular inside fluid data.')
 
+    def compile(self):
+        """
+        Precomputes the pressure at the top of every fluid layer (Pa), so the pressure at any depth is one
+        searchsorted and one multiply-add. Call again after editing top, density or surface_pressure.
+        """
+        self.top = np.asarray(self.top, dtype=float)
+        self.density = np.asarray(self.density, dtype=float)
+        bottom = np.append(self.top[1:], self.td)
+        layer = (bottom - self.top)[:-1] * self.density[:-1] * self.gn
+        self.cumulative = np.cumsum(np.append(float(self.surface_pressure), layer))
+
+    def set_data(self, top, density, surface_pressure, closed=True):
+        """
+        Populates the fluid column from values already in SI units, e.g. from a well package
+
+        :param top: layer tops (m)
+        :type top: np.ndarray
+        :param density: layer densities (kg/m3)
+        :type density: np.ndarray
+        :param surface_pressure: surface pressure (Pa)
+        :type surface_pressure: float
+        :param closed: closed at surface
+        :type closed: bool
+        """
+        self.top = np.array(top, dtype=float)
+        self.density = np.array(density, dtype=float)
+        self.surface_pressure = float(surface_pressure)
+        self.closed = bool(closed)
+        self.compile()
+
     def get_fluid_data(self, path):
         if isinstance(self.inside, bool) is False:
             mylogging.runlog.info('Read: KeyError - Inside/Outside not specified for {0} scenario.'
@@ -96,81 +122,37 @@ class Fluids:
             print('Error: KeyError - Inside/Outside not specified for {0} scenario.'.format(self.scenario))
             raise KeyError
 
-        if self.inside is True:
-            mylogging.runlog.info('Read: {0} fluid data for {1} scenario.'.format('inside', self.scenario))
-        else:
-            mylogging.runlog.info('Read: {0} fluid data for {1} scenario.'.format('inside', self.scenario))
-
-        if self.inside is True:
-            self.file = path + 'PressureInside.csv'
-        else:
-            self.file = path + 'PressureOutside.csv'
-
-        with open(self.file, 'r') as f:
-            reader = csv.reader(f)
-            lines = list(reader)
-
-        def entry_index(entry, file_lines, column=False):
-            entry_matches = list()
-            matches = read.find(entry, file_lines)
-            [entry_matches.append(match) for match in matches]
-            if column is False:
-                return entry_matches.pop(0)[0]
-            else:
-                return entry_matches.pop(0)
+        side = 'inside' if self.inside is True else 'outside'
+        mylogging.runlog.info('Read: {0} fluid data for {1} scenario.'.format(side, self.scenario))
+        self.file = path + ('PressureInside.csv' if self.inside is True else 'PressureOutside.csv')
 
-        def depth_entry(index):
-            values = list()
-            for i in range(index[0] + 2, len(lines)):
-                values.append(float(lines[i][index[1]]))
-            return values, lines[index[0] + 1][index[1]]
+        values, table = read.read_table(self.file, self.__columns, keys=('Surface Pressure', 'Closed'))
 
         try:
-            index = entry_index('Surface Pressure', lines)
-        except IndexError:
+            pressure, unit = values['Surface Pressure']
+        except KeyError:
             mylogging.runlog.info('Read: Missing {0} for {1} scenario, assumed 0.'
                                   .format('Surface Pressure', self.scenario))
             print('Read: Missing {0} for {1} scenario, assumed 0.'.format('Surface Pressure', self.scenario))
             self.surface_pressure = 0
         else:
             try:
-                self.surface_pressure = units.to_si(float(lines[index][1]), lines[index][2])
-            except:
+                self.surface_pressure = units.to_si(float(pressure), unit)
+            except (ValueError, KeyError):
+                mylogging.runlog.error("Read: 'Surface Pressure' in {0}".format(self.file))
                 print("Error: read 'Surface Pressure' in {0}".format(self.file))
+                raise KeyError("Read: 'Surface Pressure' in {0}".format(self.file))
 
         try:
-            index = entry_index('Closed', lines)
-        except IndexError:
-            mylogging.runlog.info('Read: Missing {0} for {1} scenario, assumed 0.'.format('Closed', self.scenario))
-            print('Read: Missing {0} for {1} scenario, assumed 0.'.format('Closed', self.scenario))
+            closed, _ = values['Closed']
+        except KeyError:
+            mylogging.runlog.info('Read: Missing {0} for {1} scenario, assumed True.'.format('Closed', self.scenario))
+            print('Read: Missing {0} for {1} scenario, assumed True.'.format('Closed', self.scenario))
             self.closed = True
         else:
-            try:
-                self.closed = bool(lines[index][1])
-            except:
-                print("Error: read 'Closed' in {0}".format(self.file))
-
-        try:
-            index = entry_index('Top (TVD)', lines, column=True)
-        except IndexError:
-            mylogging.runlog.info('Read: Missing {0}.'.format('fluid top data'))
-            print('Read: Missing {0} for {1}.'.format('fluid top data'))
-            self.closed = True
-        else:
-            values, unit = depth_entry(index)
-            values = units.to_si(values, unit)
-            self.top = tuple(values)
+            self.closed = closed.lower() in ('true', 'yes', '1')
 
-        try:
-            index = entry_index('Density', lines, column=True)
-        except IndexError:
-            mylogging.runlog.info('Read: Missing {0} for {1} scenario, assumed 0.'.format('fluid top data', self.scenario))
-            print('Read: Missing {0} for {1} scenario, assumed 0.'.format('fluid top data', self.scenario))
-            self.closed = True
-        else:
-            values, unit = depth_entry(index)
-            if unit == 'psi/ft':
-                values = units.to_si(values, 'psi/ft') / units.to_si(1, 'gn')
-            else:
-                values = units.to_si(values, unit)
-            self.density = tuple(values)
+        self.top = table['Top (TVD)'][0]
+        density, unit = table['Density']
+        # A pressure gradient is converted to the density giving it
+        self.density = density / units.to_si(1, 'gn') if unit == 'psi/ft' else density
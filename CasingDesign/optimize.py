@@ -0,0 +1,375 @@
+from Utilities import unitconverter as units, mylogging
+from CasingDesign import fluids, tubulars, api, ratingtable
+from config import *
+import numpy as np
+
+__chunk_size = 2 ** 21  # label x scenario x section values expanded at once
+__block_size = 1024  # labels checked together for dominance
+
+
+def inventory_ratings(inventory):
+    """
+    Burst, joint, pipe body and collapse ratings of every inventory item, looked up in the rating table for catalog
+    items. The catalog OD is kept to the API 5B precision so every listed size finds its coupling; items without
+    API 5B coupling data are flagged invalid.
+
+    :param inventory: casing inventory (SI units)
+    :type inventory: pd.DataFrame
+    :return: burst (psi), joint (lbf), tensile (lbf), collapse (psi) and valid arrays, one value per item
+    :rtype: dict
+    """
+
+    od = np.round(units.from_si(np.asarray(inventory.OD, dtype=float), 'in'), 3)
+    id = np.round(units.from_si(np.asarray(inventory.ID, dtype=float), 'in'), 3)
+    yp = np.round(units.from_si(np.asarray(inventory.YP, dtype=float), 'psi'), -3)
+    wpf = np.round(units.from_si(np.asarray(inventory.WPF, dtype=float), 'lbm/ft'), 1)
+    grade, connection = np.asarray(inventory.Grade), np.asarray(inventory.Connection)
+
+    ratings = {name: np.full(len(od), np.nan) for name in ('burst', 'joint', 'tensile', 'collapse')}
+    ratings['valid'] = np.zeros(len(od), dtype=bool)
+
+    # Catalog items come from the rating table; anything else is rated here
+    table = ratingtable.load()
+    row = ratingtable.find(table, od, id, wpf, grade, connection)
+    listed = row >= 0
+    for name in ('joint', 'tensile', 'collapse'):
+        ratings[name][listed] = table[name][row[listed]]
+    ratings['burst'][listed] = table['burst_leak' if leak_resistance else 'burst'][row[listed]]
+    ratings['valid'][listed] = ~np.isnan(ratings['burst'][listed])
+
+    for i in np.flatnonzero(~listed):
+        try:
+            rating = api.ratings(od[i], id[i], wpf[i], grade[i], yp[i], connection[i], leak=leak_resistance)
+        except IndexError:
+            mylogging.alglog.info('Optimize: No API 5B data for {0} in {1} {2}, item skipped.'
+                                  .format(connection[i], od[i], grade[i]))
+            continue
+        ratings['burst'][i], ratings['joint'][i], ratings['tensile'][i], ratings['collapse'][i] = rating
+        ratings['valid'][i] = True
+    return ratings
+
+
+def design_loads(scenarios, md):
+    """
+    Burst and collapse load envelopes and the Tensile scenario pressures on a depth grid
+
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param md: depths (ft)
+    :type md: np.ndarray
+    :return: burst envelope (psi), collapse envelope (psi), and per Tensile scenario the inside and outside
+             pressure (Pa) and the overpull (N)
+    :rtype: tuple
+    """
+
+    depth = units.to_si(md, 'ft')
+    burst, collapse, tensile = np.zeros(len(md)), np.zeros(len(md)), list()
+    for scenario in scenarios:
+        pin, pout = fluids.pressure(depth, scenario.fluid_in, scenario.fluid_out)
+        if scenario.scenario == 'Burst':
+            burst = np.maximum(burst, units.from_si(pin - pout, 'psi'))
+        elif scenario.scenario == 'Collapse':
+            collapse = np.maximum(collapse, units.from_si(pout - pin, 'psi'))
+        elif scenario.scenario == 'Tensile':
+            tensile.append((pin, pout, units.to_si(mop, 'lbf') if scenario.name == 'OMW' else 0.))
+    return burst, collapse, tensile
+
+
+def least_cost(inventory, scenarios, step=100., resolution=1000.):
+    """
+    Cheapest casing string from the inventory that meets the minimum section length and every safety factor.
+
+    Sections are chosen bottom-up with tops every `step` ft, so the hanging weight and the pressure-area steps below
+    a section are known when it is checked. A partial string is a label at the depth of its top section: its cost
+    and, per Tensile scenario, the real tension it hangs there. Labels are dropped when another label at the same
+    depth is no more expensive and hangs no more tension, or when their cost plus a lower bound on the rest of the
+    string cannot beat the cheapest complete string found so far. Collapse is checked on the uniaxial rating.
+
+    Labels whose tensions are within `resolution` of a cheaper label's are merged into it. The kept label carries
+    its own tension, so the string returned always meets every safety factor; resolution=0 makes the search exact.
+
+    :param inventory: casing inventory (SI units), e.g. readfromfile.get_inventory()
+    :type inventory: pd.DataFrame
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param step: spacing of the candidate section tops (ft)
+    :type step: float
+    :param resolution: tension below which two labels count as equal (weight_unit)
+    :type resolution: float
+    :return: casing string, total cost
+    :rtype: tuple
+    """
+
+    ratings = inventory_ratings(inventory)
+    items = __undominated(inventory, ratings)
+    area_od = tubulars.area(np.asarray(inventory.OD, dtype=float)[items])
+    area_id = tubulars.area(np.asarray(inventory.ID, dtype=float)[items])
+    weight = np.asarray(inventory.WPF, dtype=float)[items] * units.to_si(1, 'gn')
+    cost = np.asarray(inventory.Cost, dtype=float)[items]
+    burst_allow = ratings['burst'][items] / SF_burst
+    collapse_allow = ratings['collapse'][items] / SF_collapse
+    tension_allow = np.minimum(ratings['tensile'][items] / SF_tensile, ratings['joint'][items] / SF_joint)
+
+    # Candidate tops, and a fine grid adding the fluid tops so the loads are linear between fine points
+    node = np.unique(np.append(np.arange(0, total_depth, step, dtype=float), float(total_depth)))
+    fluid_top = [units.from_si(np.asarray(column.top, dtype=float), 'ft')
+                 for scenario in scenarios for column in (scenario.fluid_in, scenario.fluid_out)]
+    fine = np.unique(np.round(np.concatenate([node] + fluid_top), 6))
+    fine = fine[(fine >= 0) & (fine <= total_depth)]
+    at = np.searchsorted(fine, node)
+    z = units.to_si(node, 'ft')
+
+    burst_load, collapse_load, tensile = design_loads(scenarios, fine)
+    p_in = np.array([pin[at] for pin, pout, overpull in tensile]).reshape(len(tensile), len(node))
+    p_out = np.array([pout[at] for pin, pout, overpull in tensile]).reshape(len(tensile), len(node))
+    overpull = np.array([overpull for pin, pout, overpull in tensile])[:, None, None]
+    lbf = units.converter(None, 'lbf')
+
+    # Lower bound on the cost above each top: cheapest item meeting burst and collapse on every step, tension ignored
+    segment = np.maximum.reduceat(np.maximum(burst_load[:, None] - burst_allow, collapse_load[:, None] -
+                                             collapse_allow), at[:-1], axis=0)[:len(node) - 1]
+    cheapest = np.where(segment <= 0, cost, np.inf).min(axis=1) * np.diff(z)
+    bound = np.append(0., np.cumsum(cheapest))
+
+    # Least tension any string can add above each top, per Tensile scenario: each step adds at least the lightest
+    # buoyed weight of the inventory, and the surface pressures act on the top section
+    rise = (weight * np.diff(z)[:, None] + area_id * np.diff(p_in)[..., None] -
+            area_od * np.diff(p_out)[..., None]).min(axis=2)
+    rise = np.concatenate((np.zeros((len(tensile), 1)), np.cumsum(rise, axis=1)), axis=1)
+    rise += (p_in[:, :1] * area_id - p_out[:, :1] * area_od).min(axis=1)[:, None] + overpull[:, :, 0]
+    tension_limit = tension_allow.max()
+    tolerance = units.to_si(resolution, weight_unit)
+
+    start = (np.zeros(1), np.full((1, len(tensile)), - units.to_si(slack_off, weight_unit)), np.full(1, -1),
+             np.full(1, -1))
+
+    def search(tops, best):
+        """Cheapest string using only the allowed section tops that costs less than best, None if there is none."""
+
+        # Labels: pooled candidates per depth until that depth is expanded
+        pool = [list() for _ in node]
+        pool[-1].append(start)
+        label_item, label_parent, label_node = list(), list(), list()
+        best_label = None
+
+        for b in range(len(node) - 1, 0, -1):
+            if len(pool[b]) == 0:
+                continue
+            label_cost, state, item, parent = (np.concatenate(column) for column in zip(*pool[b]))
+            pool[b] = None
+            keep = label_cost + bound[b] < best
+            label_cost, state, item, parent = __pareto(label_cost[keep], state[keep], item[keep], parent[keep],
+                                                        tolerance)
+            label = np.arange(len(label_item), len(label_item) + len(label_cost))
+            label_item.extend(item), label_parent.extend(parent), label_node.extend([b] * len(label_cost))
+
+            # Burst and collapse only depend on the section ends and the item
+            length = z[b] - z[:b]
+            span = ((node[b] - node[:b]) >= min_section) & tops[:b]
+            burst_max = np.maximum.accumulate(burst_load[:at[b] + 1][::-1])[::-1][at[:b]]
+            collapse_max = np.maximum.accumulate(collapse_load[:at[b] + 1][::-1])[::-1][at[:b]]
+            fits = (burst_allow[:, None] >= burst_max) & (collapse_allow[:, None] >= collapse_max) & span
+
+            # Sections that fit, cheapest to complete first, so each chunk of labels only takes the ones it can afford
+            pair_item, pair_top = np.nonzero(fits)
+            reach = cost[pair_item] * length[pair_top] + bound[pair_top]
+            order = np.argsort(reach, kind='stable')
+            pair_item, pair_top, reach = pair_item[order], pair_top[order], reach[order]
+            pair_cost = cost[pair_item] * length[pair_top]
+            pair_rise = (p_in[:, b, None] * area_id[pair_item] - p_out[:, b, None] * area_od[pair_item] +
+                         weight[pair_item] * length[pair_top])
+
+            chunks = max(-(-len(label) * max(len(tensile), 1) * len(pair_item) // __chunk_size), 1)
+            for chunk in np.array_split(np.arange(len(label)), chunks):
+                if len(chunk) == 0:
+                    continue
+                n = np.searchsorted(reach, best - label_cost[chunk].min())
+                top = state[chunk, :, None] + pair_rise[None, :, :n]
+                total = label_cost[chunk, None] + pair_cost[:n]
+                ok = lbf(np.max(top + overpull[:, :, 0], axis=1)) <= tension_allow[pair_item[:n]]
+                ok &= (total + bound[pair_top[:n]] < best) & (item[chunk, None] != pair_item[:n])
+                l, p = np.nonzero(ok)
+                i, t = pair_item[p], pair_top[p]
+
+                done = t == 0
+                if np.any(done) and total[l[done], p[done]].min() < best:
+                    k = np.argmin(total[l[done], p[done]])
+                    best, best_label = total[l[done], p[done]][k], (label[chunk][l[done][k]], i[done][k])
+
+                l, p, i, t = l[~done], p[~done], i[~done], t[~done]
+                new_state = top[l, :, p] - p_in[:, t].T * area_id[i, None] + p_out[:, t].T * area_od[i, None]
+                hangs = np.all(lbf(new_state + rise[:, t].T) <= tension_limit, axis=1)
+                l, p, i, t, new_state = l[hangs], p[hangs], i[hangs], t[hangs], new_state[hangs]
+                order = np.argsort(t, kind='stable')
+                targets, first = np.unique(t[order], return_index=True)
+                for target, part in zip(targets, np.split(order, first[1:])):
+                    pool[target].append((total[l[part], p[part]], new_state[part], i[part],
+                                         label[chunk][l[part]]))
+
+        if best_label is None:
+            return best, None
+
+        # Walk back from the top section to TD
+        sections = [(0, best_label[1])]
+        j = best_label[0]
+        while label_item[j] != -1:
+            sections.append((label_node[j], label_item[j]))
+            j = label_parent[j]
+        return best, sections
+
+    # A pass over every tenth top gives the full search a cost to beat
+    best, sections = search(np.isclose(np.mod(node, 10 * step), 0) | (node == total_depth), np.inf)
+    improved, better = search(np.ones(len(node), dtype=bool), best)
+    if better is not None:
+        best, sections = improved, better
+
+    if sections is None:
+        mylogging.alglog.error('Optimize: No feasible casing string in the inventory.')
+        raise ValueError('Optimize: No feasible casing string in the inventory.')
+
+    casing = tubulars.Casing(defined=False)
+    rows = inventory.iloc[items[[item for top, item in sections]]]
+    casing.top = list(z[[top for top, item in sections]])
+    casing.od, casing.id, casing.wpf = list(rows.OD), list(rows.ID), list(rows.WPF)
+    casing.yp, casing.grade, casing.connection = list(rows.YP), list(rows.Grade), list(rows.Connection)
+    casing.cost = list(rows.Cost)
+    mylogging.alglog.info('Optimize: {0} section string, cost {1:.2f}.'.format(len(sections), best))
+    return casing, best
+
+
+def screen(inventory, top, item, scenarios, chunk=1000):
+    """
+    Cost and minimum safety factors of many candidate strings in one vectorized pass over (candidates x depths).
+
+    Every candidate is checked on the breakpoints of all of them (section tops, fluid tops and TD): between two
+    breakpoints the loads are linear and the ratings constant, so the interval ends are the only depths needed, as
+    in algorithm.breakpoint_safety. Pressure loads are shared by all candidates, each inventory item is rated once,
+    and tension is accumulated per candidate from TD upward. Candidates are processed chunk at a time.
+
+    :param inventory: casing inventory (SI units)
+    :type inventory: pd.DataFrame
+    :param top: section tops of each candidate (ft), one row per candidate starting at 0; pad with NaN
+    :type top: np.ndarray
+    :param item: inventory position of each section, same shape as top; pad with -1
+    :type item: np.ndarray
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param chunk: candidates evaluated at once
+    :type chunk: int
+    :return: one record per candidate: cost, minimum burst, collapse, tensile and joint SF
+    :rtype: np.recarray
+    """
+
+    top, item = np.atleast_2d(np.asarray(top, dtype=float)), np.atleast_2d(np.asarray(item, dtype=int))
+    if top.shape != item.shape or np.any(np.isnan(top[:, 0])) or np.any(top[:, 0] != 0):
+        mylogging.alglog.error('Optimize: Candidate tops must start at 0 and match the items.')
+        raise ValueError('Optimize: Candidate tops must start at 0 and match the items.')
+
+    # Padded sections become zero length sections of the section above them
+    pad = np.isnan(top) | (item < 0)
+    top = np.where(pad, float(total_depth), top)
+    item = np.take_along_axis(item, np.maximum.accumulate(np.where(pad, 0, np.arange(top.shape[1])), axis=1), axis=1)
+
+    # Rate every item used once
+    used, item = np.unique(item, return_inverse=True)
+    item = item.reshape(top.shape)
+    ratings = inventory_ratings(inventory.iloc[used])
+    area_od = tubulars.area(np.asarray(inventory.OD, dtype=float)[used])
+    area_id = tubulars.area(np.asarray(inventory.ID, dtype=float)[used])
+    weight = np.asarray(inventory.WPF, dtype=float)[used] * units.to_si(1, 'gn')
+    cost = np.asarray(inventory.Cost, dtype=float)[used]
+
+    fluid_top = [units.from_si(np.asarray(column.top, dtype=float), 'ft')
+                 for scenario in scenarios for column in (scenario.fluid_in, scenario.fluid_out)]
+    depth = np.unique(np.round(np.concatenate([[0., total_depth], top.ravel()] + fluid_top), 6))
+    depth = depth[(depth >= 0) & (depth <= total_depth)]
+    mid, ends = (depth[:-1] + depth[1:]) / 2, units.to_si(np.stack((depth[:-1], depth[1:])), 'ft')
+
+    burst_load, collapse_load, tensile = design_loads(scenarios, depth)
+    burst_load = np.maximum(burst_load[:-1], burst_load[1:])
+    collapse_load = np.maximum(collapse_load[:-1], collapse_load[1:])
+    at = np.searchsorted(depth, np.round(top, 6))
+    lbf = units.converter(None, 'lbf')
+
+    def safety(strength, applied):
+        sf = np.full(strength.shape, np.inf)
+        np.divide(strength, applied, out=sf, where=applied > 0)
+        return sf.min(axis=1)
+
+    result = np.recarray(len(top), dtype=[(name, float) for name in ('cost', 'burst', 'collapse', 'tensile', 'joint')])
+    for rows in np.array_split(np.arange(len(top)), max(-(-len(top) // chunk), 1)):
+        z_top = units.to_si(top[rows], 'ft')
+        z_bottom = np.append(z_top[:, 1:], np.full((len(rows), 1), units.to_si(total_depth, 'ft')), axis=1)
+        fitted = item[rows]
+        od, id, w = area_od[fitted], area_id[fitted], weight[fitted]
+
+        # Section of every interval of every candidate, taken at the interval midpoint
+        section = np.sum(top[rows, 1:, None] <= mid, axis=1)
+        pick = fitted[np.arange(len(rows))[:, None], section]
+        result.cost[rows] = np.sum(cost[fitted] * (z_bottom - z_top), axis=1)
+        result.burst[rows] = safety(ratings['burst'][pick], burst_load)
+        result.collapse[rows] = safety(ratings['collapse'][pick], collapse_load)
+
+        load = np.zeros(section.shape)
+        for pin, pout, overpull in tensile:
+            t_td = - units.to_si(slack_off, weight_unit) + pin[-1] * id[:, -1] - pout[-1] * od[:, -1]
+            step = pin[at[rows, 1:]] * (id[:, :-1] - id[:, 1:]) - pout[at[rows, 1:]] * (od[:, :-1] - od[:, 1:])
+            hanging = (z_bottom - z_top) * w
+            terms = np.empty((len(rows), 2 * top.shape[1]))
+            terms[:, 0], terms[:, 1] = t_td, hanging[:, -1]
+            terms[:, 2::2], terms[:, 3::2] = step[:, ::-1], hanging[:, -2::-1]
+            t_bottom = np.append(np.cumsum(terms, axis=1)[:, 2::2][:, ::-1], t_td[:, None], axis=1)
+
+            t_bottom, bottom, w_section = (np.take_along_axis(values, section, axis=1)
+                                           for values in (t_bottom, z_bottom, w))
+            treal = t_bottom + (bottom - ends[:, None, :]) * w_section
+            load = np.maximum(load, lbf(np.max(treal, axis=0) + overpull))
+        result.tensile[rows] = safety(ratings['tensile'][pick], load)
+        result.joint[rows] = safety(ratings['joint'][pick], load)
+    return result
+
+
+def __undominated(inventory, ratings):
+    """
+    Valid items no other item beats outright. Pressures never fall with depth, so an item that costs no more, weighs
+    no more, has no larger ID, no smaller OD and no lower rating always leaves a string at least as cheap and light.
+
+    :return: inventory positions of the kept items
+    :rtype: np.ndarray
+    """
+    items = np.flatnonzero(ratings['valid'])
+    better = [np.asarray(inventory.Cost, dtype=float)[items], np.asarray(inventory.WPF, dtype=float)[items],
+              np.asarray(inventory.ID, dtype=float)[items], - np.asarray(inventory.OD, dtype=float)[items]]
+    better += [- ratings[name][items] for name in ('burst', 'joint', 'tensile', 'collapse')]
+    dominated = np.ones((len(items), len(items)), dtype=bool)
+    for column in better:
+        dominated &= column[:, None] <= column
+    # Identical items: keep the first
+    dominated &= ~np.tril(np.all([column[:, None] == column for column in better], axis=0))
+    return items[~np.any(dominated, axis=0)]
+
+
+def __pareto(cost, state, item, parent, resolution=0.):
+    """
+    Labels not dominated by a label that is no more expensive and hangs no more tension (plus resolution, N) in every
+    scenario
+
+    :return: cost, state, item and parent of the kept labels
+    :rtype: tuple
+    """
+    order = np.lexsort((state.sum(axis=1), cost))
+    front = np.empty((0, state.shape[1]))
+    keep = list()
+    for block in np.array_split(order, max(-(-len(order) // __block_size), 1)):
+        dominated = np.ones((len(block), len(front)), dtype=bool)
+        for column in range(state.shape[1]):
+            dominated &= front[:, column] <= state[block, column, None] + resolution
+        block = block[~np.any(dominated, axis=1)]
+        # Within the block a label can only be dominated by one sorted ahead of it
+        dominated = np.ones((len(block), len(block)), dtype=bool)
+        for column in range(state.shape[1]):
+            dominated &= state[block, column, None] <= state[block, column] + resolution
+        block = block[~np.any(np.triu(dominated, 1), axis=0)]
+        front = np.vstack((front, state[block]))
+        keep.extend(block)
+    return cost[keep], state[keep], item[keep], parent[keep]
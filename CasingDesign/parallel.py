@@ -0,0 +1,135 @@
+"""
+Parallel evaluation of the scenario stages.
+
+Every scenario is independent from its depth grid through the pressure, tension, design equation and stress stages;
+only master_scenario needs them all. These stages run on a concurrent.futures process (or thread) pool, one task per
+scenario, and only the depth columns come back. Results are applied in submission order, so a run is identical to
+the serial one whatever the number of workers.
+"""
+
+from CasingDesign import algorithm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import *
+import numpy as np
+import os
+
+__categorical = ('grades', 'grade_code', 'conns', 'conn_code')
+
+
+def evaluate(casing, scenario, md=None):
+    """
+    Runs the independent stages of one scenario in place: depth grid, casing properties, pressures, tension, design
+    equations and stress state
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenario: Scenario object
+    :type scenario: algorithm.Scenario
+    :param md: depth grid (ft); None gives the 1 ft grid
+    :type md: np.ndarray
+    :return: scenario
+    :rtype: algorithm.Scenario
+    """
+
+    algorithm.update_depth(casing, scenario, md)
+    algorithm.update_casing(casing, scenario)
+    algorithm.pressure([scenario])
+    algorithm.tension([scenario], casing)
+    algorithm.burst([scenario])
+    algorithm.collapse([scenario])
+    algorithm.stress_state([scenario])
+    algorithm.yield_pt_adjust([scenario])
+    return scenario
+
+
+def results(scenario):
+    """
+    Compact results of a scenario: its depth columns and categorical codes
+
+    :param scenario: Scenario object
+    :type scenario: algorithm.Scenario
+    :return: column name to array
+    :rtype: dict
+    """
+    return {column: getattr(scenario, column) for column in scenario.stored + __categorical}
+
+
+def restore(scenario, result):
+    """
+    Applies the results of a scenario evaluated elsewhere
+
+    :param scenario: Scenario object
+    :type scenario: algorithm.Scenario
+    :param result: column name to array, from results
+    :type result: dict
+    """
+    for column, values in result.items():
+        setattr(scenario, column, values)
+
+
+def run(casing, scenarios, md=None, workers=workers, threads=False):
+    """
+    Evaluates the scenarios of a well on a pool; the scenarios are updated in place
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param md: depth grid shared by the scenarios (ft); None gives the 1 ft grid
+    :type md: np.ndarray
+    :param workers: pool size; 1 runs serially, None uses every core
+    :type workers: int
+    :param threads: use a thread pool instead of a process pool
+    :type threads: bool
+    :return: scenarios
+    :rtype: list
+    """
+
+    for scenario, result in zip(scenarios, __map([(casing, scenario, md) for scenario in scenarios], workers,
+                                                   threads)):
+        restore(scenario, result)
+    return scenarios
+
+
+def wells(cases, workers=workers, threads=False):
+    """
+    Evaluates several wells on one pool, then builds the master scenario and casing strength of each
+
+    :param cases: (casing, scenarios, md) of each well; md may be None
+    :type cases: list
+    :param workers: pool size; 1 runs serially, None uses every core
+    :type workers: int
+    :param threads: use a thread pool instead of a process pool
+    :type threads: bool
+    :return: master scenario of each well, in the order of cases
+    :rtype: list
+    """
+
+    tasks = [(casing, scenario, md) for casing, scenarios, md in cases for scenario in scenarios]
+    done = iter(__map(tasks, workers, threads))
+
+    masters = list()
+    for casing, scenarios, md in cases:
+        for scenario in scenarios:
+            restore(scenario, next(done))
+        master = algorithm.Scenario()
+        algorithm.master_scenario(master, scenarios)
+        algorithm.casing_strength(master)
+        masters.append(master)
+    return masters
+
+
+def __task(task):
+    """Pool task: evaluates one (casing, scenario, md) and returns its results."""
+    return results(evaluate(*task))
+
+
+def __map(tasks, workers, threads):
+    """Results of the tasks in submission order."""
+    if workers == 1 or len(tasks) <= 1:
+        return [__task(task) for task in tasks]
+
+    size = workers if workers is not None else os.cpu_count() or 1
+    executor = ThreadPoolExecutor if threads is True else ProcessPoolExecutor
+    with executor(max_workers=size) as pool:
+        return list(pool.map(__task, tasks, chunksize=max(int(np.ceil(len(tasks) / (4 * size))), 1)))
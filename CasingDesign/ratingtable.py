@@ -0,0 +1,188 @@
+"""
+Rating table of the whole casing inventory.
+
+Every catalog item has fixed burst (with and without leak resistance), joint, pipe body and collapse ratings, plus a
+biaxial collapse curve over the axial stress to yield point ratio. The table is built once, saved next to the
+catalog, and rebuilt when the catalog, the API specification database, the axial stress grid or the
+collapse_table setting changes.
+"""
+
+from Utilities import connections, mylogging
+from CasingDesign import api, stress
+from config import *
+import numpy as np
+import hashlib
+import tempfile
+import os
+
+__fields = ('burst', 'burst_leak', 'joint', 'tensile', 'collapse')
+__tables = dict()
+
+
+def axial_grid(points=201):
+    """
+    Axial stress to yield point ratios of the biaxial collapse curves, from full compression to full tension.
+    Sine spacing packs the ratios towards +/-1, where the curves fall steeply to zero.
+
+    :param points: number of ratios
+    :type points: int
+    :rtype: np.ndarray
+    """
+    return np.sin(np.linspace(-np.pi / 2, np.pi / 2, points))
+
+
+def build(catalog=root + '/Data/CasingCatalog.db', database=root + '/Data/APIspecifications.db', points=201):
+    """
+    Ratings of every inventory item. Items without API 5B coupling data get NaN ratings.
+
+    :param catalog: casing catalog file path
+    :type catalog: str
+    :param database: API specifications file path
+    :type database: str
+    :param points: number of axial stress ratios of the biaxial collapse curves
+    :type points: int
+    :return: od, id (in), wpf (lbm/ft), yp (psi), grade, connection, burst, burst_leak, collapse (psi),
+             joint, tensile (lbf), ratio and collapse_biax (psi, one row per item) arrays
+    :rtype: dict
+    """
+
+    rows = connections.query(catalog, 'SELECT OD, ID, WPF, Grade, Conn FROM Inventory', immutable=False)
+    table = {name: np.array([row[k] for row in rows], dtype=float if k < 3 else str)
+             for k, name in enumerate(('od', 'id', 'wpf', 'grade', 'connection'))}
+    table['yp'] = np.array([float(grade.split('-')[1]) * 1000 for grade in table['grade']])
+    table['ratio'] = axial_grid(points)
+    table.update(api.ratings_batch(table['od'], table['id'], table['wpf'], table['grade'], table['yp'],
+                                   table['connection'], database=database))
+    for i in np.flatnonzero(np.isnan(table['burst'])):
+        mylogging.alglog.info('Ratings: No API 5B data for {0} in {1} {2}.'
+                              .format(table['connection'][i], table['od'][i], table['grade'][i]))
+
+    # The tension formula applies from zero axial stress up, as in algorithm.yield_pt_adjust. No collapse
+    # resistance is left once the adjusted yield point reaches zero
+    ratio, yp = table['ratio'][np.newaxis], table['yp'][:, np.newaxis]
+    ypadj = stress.biaxial_yield(yp, ratio * yp, tension=ratio >= 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curve = np.where(ypadj > 0, api.collapse(table['od'][:, np.newaxis], table['id'][:, np.newaxis], ypadj,
+                                                 database=database), 0.)
+    table['collapse_biax'] = np.where(np.isnan(table['burst'])[:, np.newaxis], np.nan, curve)
+    return table
+
+
+def load(catalog=root + '/Data/CasingCatalog.db', database=root + '/Data/APIspecifications.db',
+         cache=root + '/Data/CasingRatings.npz', points=201):
+    """
+    Rating table of the inventory: from memory, from the cache file when it matches the current catalog and
+    API specifications, or built and saved to the cache
+
+    :param catalog: casing catalog file path
+    :type catalog: str
+    :param database: API specifications file path
+    :type database: str
+    :param cache: rating table file path
+    :type cache: str
+    :param points: number of axial stress ratios of the biaxial collapse curves
+    :type points: int
+    :return: rating table, see build
+    :rtype: dict
+    """
+
+    key = np.array([__hash(catalog), __hash(database), hashlib.sha1(axial_grid(points).tobytes()).hexdigest(),
+                    str(collapse_table)])
+    try:
+        table = __tables[cache]
+    except KeyError:
+        table = None
+    if table is not None and np.array_equal(table['key'], key):
+        return table
+
+    try:
+        with np.load(cache, allow_pickle=False) as f:
+            table = {name: f[name] for name in f.files}
+    except (OSError, ValueError):
+        table = None
+
+    if table is None or not np.array_equal(table['key'], key):
+        mylogging.runlog.info('Ratings: Building the rating table of {0}.'.format(catalog))
+        table = build(catalog, database, points)
+        table['key'] = key
+        __save(cache, table)
+
+    __tables[cache] = table
+    return table
+
+
+def find(table, od, id, wpf, grade, connection):
+    """
+    Rows of the rating table matching each item, -1 where the item is not in the table
+
+    :param table: rating table, see build
+    :type table: dict
+    :param od: outer diameters (in)
+    :type od: np.ndarray
+    :param id: inner diameters (in)
+    :type id: np.ndarray
+    :param wpf: weights per foot (lbm/ft)
+    :type wpf: np.ndarray
+    :param grade: grades
+    :type grade: np.ndarray
+    :param connection: connections
+    :type connection: np.ndarray
+    :return: table row of each item
+    :rtype: np.ndarray
+    """
+
+    rows = {__key(*values): i for i, values in
+            enumerate(zip(table['od'], table['id'], table['wpf'], table['grade'], table['connection']))}
+    return np.array([rows.get(__key(*values), -1) for values in zip(od, id, wpf, grade, connection)], dtype=int)
+
+
+def collapse_biaxial(table, row, axial):
+    """
+    Biaxial collapse rating interpolated linearly on the table curves. The API 5C3 regimes do not always meet, so
+    within one grid step of a regime change the value lies between the two regimes.
+
+    :param table: rating table, see build
+    :type table: dict
+    :param row: table row of each value
+    :type row: np.ndarray
+    :param axial: axial stress (psi)
+    :type axial: np.ndarray
+    :return: biaxial collapse rating (psi)
+    :rtype: np.ndarray
+    """
+
+    row, axial = np.broadcast_arrays(np.asarray(row, dtype=int), np.asarray(axial, dtype=float))
+    ratio = np.clip(axial / table['yp'][row], -1., 1.)
+    grid = table['ratio']
+    right = np.clip(np.searchsorted(grid, ratio, side='right'), 1, len(grid) - 1)
+    weight = (ratio - grid[right - 1]) / (grid[right] - grid[right - 1])
+    curve = table['collapse_biax']
+    return curve[row, right - 1] + weight * (curve[row, right] - curve[row, right - 1])
+
+
+def __key(od, id, wpf, grade, connection):
+    """Item key at the catalog precision."""
+    return round(float(od), 3), round(float(id), 3), round(float(wpf), 1), str(grade), str(connection)
+
+
+def __hash(file):
+    """SHA-1 of a file."""
+    with open(file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def __save(cache, table):
+    """Writes the table through a temporary file, so a reader never sees a partial file."""
+    try:
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(cache), suffix='.npz')
+    except OSError:
+        mylogging.runlog.info('Ratings: Unable to write the rating table {0}.'.format(cache))
+        return
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **table)
+        os.replace(temporary, cache)
+    except OSError:
+        mylogging.runlog.info('Ratings: Unable to write the rating table {0}.'.format(cache))
+        if os.path.exists(temporary):
+            os.remove(temporary)
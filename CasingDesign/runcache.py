@@ -0,0 +1,195 @@
+"""
+On-disk cache of whole design runs.
+
+A run is keyed by a hash of everything its results depend on: the casing sections, the fluid columns of every
+scenario (as read from PressureInside.csv and PressureOutside.csv or a well package), the config values used by the
+calculations and the API specification database. Plotting settings and safety factors are not part of the key.
+Each stage (the evaluated scenarios, then the master scenario with its casing strength) is one npz file; files are
+touched when read and the least recently used ones are removed once the cache grows past run_cache_size.
+"""
+
+from Utilities import mylogging
+from CasingDesign import algorithm, parallel
+from config import *
+import numpy as np
+import hashlib
+import tempfile
+import os
+
+__version = 1  # bump when the stored layout or the calculations change
+__settings = ('total_depth', 'hole_size', 'slack_off', 'mop', 'leak_resistance', 'collapse_table', 'grid_tolerance',
+              'depth_unit', 'diameter_unit', 'weight_unit', 'thermal_unit', 'pressure_grad_unit')
+__categorical = ('grades', 'grade_code', 'conns', 'conn_code')
+
+
+def run_key(casing, scenarios, database=root + '/Data/APIspecifications.db'):
+    """
+    Hash of the inputs of a design run
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param database: API specifications file path
+    :type database: str
+    :return: SHA-1 hex digest
+    :rtype: str
+    """
+
+    digest = hashlib.sha1(str(__version).encode())
+    for field in ('top', 'od', 'id', 'wpf', 'yp'):
+        digest.update(np.asarray(getattr(casing, field), dtype=float).tobytes())
+    for field in ('grade', 'connection'):
+        digest.update('\0'.join(str(value) for value in getattr(casing, field)).encode())
+    for scenario in scenarios:
+        digest.update('{0}\0{1}\0'.format(scenario.scenario, scenario.name).encode())
+        for fluid in (scenario.fluid_in, scenario.fluid_out):
+            digest.update(np.asarray(fluid.top, dtype=float).tobytes())
+            digest.update(np.asarray(fluid.density, dtype=float).tobytes())
+            digest.update(np.float64(fluid.surface_pressure).tobytes())
+    digest.update(repr([(name, globals()[name]) for name in __settings]).encode())
+    with open(database, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def evaluate(casing, scenarios, workers=workers, path=root + '/Data/RunCache'):
+    """
+    Depth grid, scenario stages, master scenario and casing strength of a well, each stage read from the cache when
+    the run inputs are unchanged and stored otherwise. The scenarios are updated in place.
+
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param workers: pool size; 1 runs serially, None uses every core
+    :type workers: int
+    :param path: cache directory
+    :type path: str
+    :return: master scenario
+    :rtype: algorithm.Scenario
+    """
+
+    key = run_key(casing, scenarios) if run_cache_size > 0 else None
+
+    # Scenarios share the depth grid, so each depth column is stored as one scenario by depth array
+    stored = load(key, 'scenarios', path)
+    if stored is None:
+        md = algorithm.depth_grid(casing, scenarios)
+        parallel.run(casing, scenarios, md, workers=workers)
+        arrays = {column: np.stack([getattr(scenario, column) for scenario in scenarios])
+                  for column in algorithm.Scenario.columns + ('grade_code', 'conn_code')}
+        for i, scenario in enumerate(scenarios):
+            arrays['{0}/grades'.format(i)], arrays['{0}/conns'.format(i)] = scenario.grades, scenario.conns
+        save(key, 'scenarios', arrays, path)
+    else:
+        for i, scenario in enumerate(scenarios):
+            result = {column: stored[column][i] for column in algorithm.Scenario.columns + ('grade_code', 'conn_code')}
+            result['grades'], result['conns'] = stored['{0}/grades'.format(i)], stored['{0}/conns'.format(i)]
+            parallel.restore(scenario, result)
+
+    master = algorithm.Scenario()
+    stored = load(key, 'master', path)
+    if stored is None:
+        algorithm.master_scenario(master, scenarios)
+        algorithm.casing_strength(master)
+        arrays = parallel.results(master)
+        arrays.update({'governing/' + mode: np.asarray(runs) for mode, runs in master.governing.items()})
+        save(key, 'master', arrays, path)
+    else:
+        master.scenario = 'Collapse'
+        parallel.restore(master, {column: stored[column] for column in
+                                  algorithm.Scenario.columns + algorithm.Scenario.strengths + __categorical})
+        master.governing = {name.split('/')[1]: stored[name].view(np.recarray) for name in stored
+                            if name.startswith('governing/')}
+    return master
+
+
+def load(key, stage, path=root + '/Data/RunCache'):
+    """
+    Arrays of a cached stage, or None when the stage is not cached
+
+    :param key: run key, see run_key; None disables the cache
+    :type key: str
+    :param stage: stage name
+    :type stage: str
+    :param path: cache directory
+    :type path: str
+    :rtype: dict
+    """
+
+    if key is None:
+        return None
+    file = os.path.join(path, '{0}.{1}.npz'.format(key, stage))
+    try:
+        with np.load(file, allow_pickle=False) as f:
+            arrays = {name: f[name] for name in f.files}
+        os.utime(file)
+    except (OSError, ValueError):
+        return None
+    mylogging.runlog.info('Cache: {0} stage of run {1} reused.'.format(stage, key[:12]))
+    return arrays
+
+
+def save(key, stage, arrays, path=root + '/Data/RunCache', size=run_cache_size):
+    """
+    Stores the arrays of a stage through a temporary file, then trims the cache to its size
+
+    :param key: run key, see run_key; None disables the cache
+    :type key: str
+    :param stage: stage name
+    :type stage: str
+    :param arrays: array name to array
+    :type arrays: dict
+    :param path: cache directory
+    :type path: str
+    :param size: largest cache size (bytes)
+    :type size: int
+    """
+
+    if key is None:
+        return
+    file = os.path.join(path, '{0}.{1}.npz'.format(key, stage))
+    try:
+        os.makedirs(path, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=path, suffix='.tmp')
+    except OSError:
+        mylogging.runlog.info('Cache: Unable to write {0}.'.format(file))
+        return
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, file)
+    except OSError:
+        mylogging.runlog.info('Cache: Unable to write {0}.'.format(file))
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return
+    evict(path, size)
+
+
+def evict(path=root + '/Data/RunCache', size=run_cache_size):
+    """
+    Removes the least recently used stage files until the cache fits in its size
+
+    :param path: cache directory
+    :type path: str
+    :param size: largest cache size (bytes)
+    :type size: int
+    """
+
+    files = list()
+    for entry in os.scandir(path):
+        if entry.name.endswith('.npz'):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(file[1] for file in files)
+    for _, length, file in sorted(files):
+        if total <= size:
+            break
+        try:
+            os.remove(file)
+        except OSError:
+            continue
+        total -= length
+        mylogging.runlog.info('Cache: Evicted {0}.'.format(os.path.basename(file)))
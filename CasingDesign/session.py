@@ -0,0 +1,153 @@
+"""
+Interactive casing design session.
+
+A session keeps the scenarios of a well evaluated in memory and updates them when one casing section is edited.
+Pressures and the design equations depend only on the fluids, so an edit never recomputes them. Casing properties
+are recomputed where a section changed, and tension, stresses and the adjusted yield point from the surface down to
+the base of the change, since a section only carries the weight hung below it. The master scenario and the casing
+strength follow, with ratings memoized per section.
+"""
+
+from Utilities import unitconverter as units, mylogging
+from CasingDesign import algorithm, tubulars, parallel
+from config import *
+import numpy as np
+
+
+class DesignSession:
+    """
+    Casing design kept evaluated between edits. The casing sections are numbered from the surface down, as in
+    Casing.csv.
+    """
+
+    fields = {'top': depth_unit, 'od': diameter_unit, 'id': diameter_unit, 'wpf': 'lbm/ft', 'grade': None,
+              'connection': None}
+
+    def __init__(self, casing=None, scenarios=None, md=None, workers=workers):
+        """
+        :param casing: Casing object; read from Casing.csv by default
+        :type casing: tubulars.Casing
+        :param scenarios: scenarios list; read from the scenario directories by default
+        :type scenarios: list
+        :param md: depth grid (ft); None gives the 1 ft grid
+        :type md: np.ndarray
+        :param workers: pool size of the first evaluation; 1 runs serially, None uses every core
+        :type workers: int
+        """
+
+        self.casing = casing if casing is not None else tubulars.Casing()
+        self.scenarios = scenarios if scenarios is not None else algorithm.get_scenarios()
+        for field in ('top', 'od', 'id', 'wpf', 'yp'):
+            setattr(self.casing, field, np.array(getattr(self.casing, field), dtype=float))
+        self.casing.grade, self.casing.connection = list(self.casing.grade), list(self.casing.connection)
+
+        parallel.run(self.casing, self.scenarios, md, workers=workers)
+        self.master = algorithm.Scenario()
+        self.__update_master()
+        mylogging.runlog.info('Session: {0} scenarios on {1} depths.'.format(len(self.scenarios),
+                                                                            len(self.master.md)))
+
+    def edit(self, section, **values):
+        """
+        Changes one casing section and updates the scenarios, the master scenario and the casing strength.
+        Values are in the units of Casing.csv: top (ft), od and id (in), wpf (lbm/ft), grade and connection.
+
+        :param section: section index, from the surface down
+        :type section: int
+        :param values: new values by field name
+        :return: depth range (ft) where the loads were recomputed
+        :rtype: tuple
+        """
+
+        casing = self.casing
+        count = len(casing.top)
+        if not 0 <= section < count:
+            mylogging.alglog.info('Session: No casing section {0}.'.format(section))
+            raise IndexError('Session: No casing section {0}.'.format(section))
+        unknown = sorted(set(values) - set(self.fields))
+        if len(unknown) > 0:
+            mylogging.alglog.info('Session: Unknown casing fields {0}.'.format(', '.join(unknown)))
+            raise ValueError('Session: Unknown casing fields {0}.'.format(', '.join(unknown)))
+
+        # Properties change within the section; moving its top only changes the depths it moved across
+        old_top = self.__top(casing.top)
+        base = np.append(old_top[1:], total_depth)
+        lower, upper = old_top[section], base[section]
+        if 'top' in values:
+            # The grid breaks at the top as update_casing rounds it, not at the value given
+            top = float(self.__top(units.to_si(float(values['top']), self.fields['top'])))
+            if section == 0 or not old_top[section - 1] < top < base[section]:
+                mylogging.alglog.info('Session: Top of section {0} must lie between its neighbours.'.format(section))
+                raise ValueError('Session: Top of section {0} must lie between its neighbours.'.format(section))
+            lower = min(lower, top)
+            # The break point 0.01 ft below the new top is a new depth of the grid
+            upper = max(old_top[section], top) + 0.01 if len(values) == 1 else upper
+
+        for field, value in values.items():
+            unit = self.fields[field]
+            if field in ('grade', 'connection'):
+                getattr(casing, field)[section] = str(value)
+            else:
+                getattr(casing, field)[section] = units.to_si(float(value), unit)
+        if 'grade' in values:
+            casing.yp[section] = units.to_si(float(str(values['grade']).split('-')[1]) * 1000, 'psi')
+
+        if 'top' in values:
+            self.__regrid(old_top[section])
+        self.__update(lower, upper)
+        self.__update_master()
+        mylogging.runlog.info('Session: Section {0} changed, loads updated from 0 to {1} ft.'.format(section, upper))
+        return 0., upper
+
+    def __update(self, lower, upper):
+        """Casing properties within [lower, upper] and loads from the surface down to upper. The scenario views
+        write through to the depth columns; their grade and connection codes are rebuilt whole."""
+        casing = self.casing
+        md = self.scenarios[0].md
+        start, stop = np.searchsorted(md, lower, side='left'), np.searchsorted(md, upper, side='right')
+        for scenario in self.scenarios:
+            algorithm.update_casing(casing, scenario.take(slice(start, stop)))
+            self.__codes(scenario)
+            part = scenario.take(slice(0, stop))
+            algorithm.tension([part], casing)
+            algorithm.stress_state([part])
+            algorithm.yield_pt_adjust([part])
+
+    def __regrid(self, old):
+        """Moves the casing break point of the depth grid from the old top to the new one."""
+        md = self.scenarios[0].md
+        top = self.__top(self.casing.top)
+        grid = np.unique(np.append(md[md != old + 0.01], top[(top > 0) & (top < total_depth)] + 0.01))
+        kept = np.isin(grid, md)
+        old_index = np.searchsorted(md, grid[kept])
+
+        for scenario in self.scenarios:
+            previous = {column: getattr(scenario, column) for column in algorithm.Scenario.columns}
+            scenario.allocate(grid)
+            for column, values in previous.items():
+                getattr(scenario, column)[kept] = values[old_index]
+            fresh = scenario.take(np.flatnonzero(~kept))
+            algorithm.pressure([fresh])
+            algorithm.burst([fresh])
+            algorithm.collapse([fresh])
+            for column in ('pin', 'pout', 'burst', 'collapse'):
+                getattr(scenario, column)[~kept] = getattr(fresh, column)
+
+    def __codes(self, scenario):
+        """Grade and connection codes of every depth from the section labels."""
+        casing = self.casing
+        section = np.searchsorted(self.__top(casing.top)[1:], scenario.md, side='left')
+        for field, labels, codes in (('grade', 'grades', 'grade_code'), ('connection', 'conns', 'conn_code')):
+            names, inverse = np.unique(np.asarray(getattr(casing, field), dtype=str), return_inverse=True)
+            setattr(scenario, labels, names)
+            setattr(scenario, codes, inverse.astype(np.int16)[section])
+
+    def __update_master(self):
+        """Master scenario and casing strength from the current scenarios."""
+        algorithm.master_scenario(self.master, self.scenarios)
+        algorithm.casing_strength(self.master)
+
+    @staticmethod
+    def __top(top):
+        """Casing tops rounded to the foot, as update_casing places them."""
+        return np.round(units.from_si(np.asarray(top, dtype=float), 'ft'))
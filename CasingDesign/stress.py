@@ -4,62 +4,98 @@ import numpy as np
 
 def biaxial_yield(yield_point, sigma_a, tension=True, collapse=True):
     """
-    Yield point adjusted for biaxial stress conditions
+    Yield point adjusted for biaxial stress conditions.
+    Works element-wise on arrays; tension and collapse may be boolean arrays, e.g. tension=treal >= 0.
 
     :param yield_point: yield point (psi)
-    :type yield_point: float
+    :type yield_point: float or np.ndarray
     :param sigma_a: axial stress (psi)
-    :type sigma_a: float
+    :type sigma_a: float or np.ndarray
     :param tension: Is the pipe in tension?
-    :type tension: bool
+    :type tension: bool or np.ndarray
     :param collapse: collapse scenario?
-    :type collapse: bool
+    :type collapse: bool or np.ndarray
     :return: yield point adjusted, Y_pa (psi)
-    :rtype: float
+    :rtype: float or np.ndarray
     """
 
-    if tension is True:
-        if collapse is True:
-            return yield_point * (np.sqrt(1 - 0.75 * (sigma_a / yield_point) ** 2) - 0.5 * (sigma_a / yield_point))
-        else:
-            return yield_point * (np.sqrt(1 - 0.75 * (sigma_a / yield_point) ** 2) + 0.5 * (sigma_a / yield_point))
-    if collapse is True:
-        return yield_point * (np.sqrt(1 - 0.75 * (sigma_a / yield_point) ** 2) + 0.5 * (sigma_a / yield_point))
-    else:
-        return yield_point * (np.sqrt(1 - 0.75 * (sigma_a / yield_point) ** 2) - 0.5 * (sigma_a / yield_point))
+    # The axial term is subtracted for collapse in tension and burst in compression, added otherwise
+    sign = np.where(np.equal(tension, collapse), -1., 1.)
+    return yield_point * (np.sqrt(1 - 0.75 * (sigma_a / yield_point) ** 2) + sign * (0.5 * (sigma_a / yield_point)))
 
 
 def triaxial_yield(yield_point, sigma_a, sigma_r, tension=True, collapse=True):
     """
-    Yield point adjusted for triaxial stress conditions
+    Yield point adjusted for triaxial stress conditions.
+    Works element-wise on arrays; tension and collapse may be boolean arrays.
 
     :param yield_point: yield point (psi)
-    :type yield_point: float
+    :type yield_point: float or np.ndarray
     :param sigma_a: axial stress (psi)
-    :type sigma_a: float
+    :type sigma_a: float or np.ndarray
     :param sigma_r: radial stress (psi)
-    :type sigma_r: float
+    :type sigma_r: float or np.ndarray
     :param tension: Is the pipe in tension?
-    :type tension: bool
+    :type tension: bool or np.ndarray
     :param collapse: collapse scenario?
-    :type collapse: bool
+    :type collapse: bool or np.ndarray
     :return: yield point adjusted, Y_pa (psi)
-    :rtype: float
+    :rtype: float or np.ndarray
+    """
+
+    sign = np.where(np.equal(tension, collapse), -1., 1.)
+    return yield_point * (np.sqrt(1 - 0.75 * (sigma_a - sigma_r) / yield_point) +
+                          sign * (0.5 * (sigma_a - sigma_r) / yield_point)) + sigma_r
+
+
+def lame(od, id, Pi, Po, t_real, out=None):
+    """
+    Axial, radial, tangential and von Mises stresses in one pass, sharing the squared radii and Lame constants.
+    Same formulas as axial, radial, tangential and von_mises.
+
+    :param od: outer diameter, OD (in)
+    :type od: np.ndarray
+    :param id: inner diameter, ID (in)
+    :type id: np.ndarray
+    :param Pi: inside pressure, P_i (psi)
+    :type Pi: np.ndarray
+    :param Po: outside pressure, P_o (psi)
+    :type Po: np.ndarray
+    :param t_real: real tension (lbf)
+    :type t_real: np.ndarray
+    :param out: axial, radial, tangential and von Mises arrays to write into, of the broadcast shape
+    :type out: tuple
+    :return: sigma_a, sigma_r, sigma_t, sigma_vm (psi)
+    :rtype: tuple
     """
 
-    if tension is True:
-        if collapse is True:
-            return yield_point * (np.sqrt(1 - 0.75 * (sigma_a - sigma_r) / yield_point) -
-                                  0.5 * (sigma_a - sigma_r) / yield_point) + sigma_r
-        else:
-            return yield_point * (np.sqrt(1 - 0.75 * (sigma_a - sigma_r) / yield_point) +
-                                  0.5 * (sigma_a - sigma_r) / yield_point) + sigma_r
-    if collapse is True:
-        return yield_point * (np.sqrt(1 - 0.75 * (sigma_a - sigma_r) / yield_point) +
-                              0.5 * (sigma_a - sigma_r) / yield_point) + sigma_r
-    else:
-        return yield_point * (np.sqrt(1 - 0.75 * (sigma_a - sigma_r) / yield_point) -
-                              0.5 * (sigma_a - sigma_r) / yield_point) + sigma_r
+    ri2 = (id / 2) ** 2
+    ro2 = (od / 2) ** 2
+    wall = ro2 - ri2
+    k1 = (ri2 * Pi - ro2 * Po) / wall
+    k2 = (Pi - Po) * ri2 * ro2 / (wall * ri2)
+
+    if out is None:
+        shape = np.broadcast(od, id, Pi, Po, t_real).shape
+        out = tuple(np.empty(shape) for _ in range(4))
+    sigma_a, sigma_r, sigma_t, sigma_vm = out
+    np.divide(t_real, np.pi / 4 * (od ** 2 - id ** 2), out=sigma_a)
+    np.subtract(k1, k2, out=sigma_r)
+    np.add(k1, k2, out=sigma_t)
+
+    # The first Lame constant is spent, so it holds the von Mises terms when it has the full shape
+    term = k1 if isinstance(k1, np.ndarray) and k1.shape == sigma_vm.shape else np.empty_like(sigma_vm)
+    np.subtract(sigma_r, sigma_t, out=sigma_vm)
+    np.square(sigma_vm, out=sigma_vm)
+    np.subtract(sigma_r, sigma_a, out=term)
+    np.square(term, out=term)
+    np.add(sigma_vm, term, out=sigma_vm)
+    np.subtract(sigma_t, sigma_a, out=term)
+    np.square(term, out=term)
+    np.add(sigma_vm, term, out=sigma_vm)
+    np.divide(sigma_vm, 2, out=sigma_vm)
+    np.sqrt(sigma_vm, out=sigma_vm)
+    return sigma_a, sigma_r, sigma_t, sigma_vm
 
 
 def radial(od, id, Pi, Po):
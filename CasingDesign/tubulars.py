@@ -1,18 +1,41 @@
-from Utilities import unitconverter as units, readfromfile as read, mylogging
+from Utilities import unitconverter as units, readfromfile as read, wellpackage, mylogging
 from CasingDesign import fluids
-import csv
 from config import *
 import numpy as np
 
 
+def tension_profile(depth, casing, inside, outside, overpull=0.):
+    """
+    Real and effective tension for an array of depths in one pass
+
+    :param depth: depths of interest (m)
+    :type depth: float or np.ndarray
+    :param casing: casing string specifications object
+    :type casing: Casing
+    :param inside: fluids column object
+    :type inside: fluids.Fluid
+    :param outside: fluids column object
+    :type outside: fluids.Fluid
+    :param overpull: pull applied at surface on top of the string weight (N)
+    :type overpull: float
+    :return: T_real (N), T_eff (N)
+    :rtype: tuple
+    """
+
+    depth = np.asarray(depth, dtype=float)
+    t_real = tension_real(depth, casing, inside, outside)
+    t_real += overpull
+    return t_real[()], tension_eff(t_real, depth, casing, inside, outside)
+
+
 def tension_eff(t_real, depth, casing, inside, outside):
     """
     Effective tension at depth
 
     :param t_real: T_real (N)
-    :type t_real: float
+    :type t_real: float or np.ndarray
     :param depth: depth of interest (m)
-    :type depth: float
+    :type depth: float or np.ndarray
     :param casing: casing string specifications object
     :type casing: Casing
     :param inside: fluids column object
@@ -20,69 +43,92 @@ def tension_eff(t_real, depth, casing, inside, outside):
     :param outside: fluids column object
     :type outside: fluids.Fluid
     :return: T_eff (N)
-    :rtype: float
+    :rtype: float or np.ndarray
     """
 
-    i = 0
-    od, id = casing.od[0], casing.id[0]
-    while depth - casing.top[i] >= 0:
-        od, id = casing.od[i], casing.id[i]
-        i += 1
-        try:
-            casing.top[i]
-        except IndexError:
-            break
+    depth = np.asarray(depth, dtype=float)
+    section = np.searchsorted(np.asarray(casing.top[1:], dtype=float), depth, side='right')
+    od, id = np.asarray(casing.od, dtype=float)[section], np.asarray(casing.id, dtype=float)[section]
 
     area_out, area_in = area(od), area(id)
     p_in, p_out = fluids.pressure(depth, inside, outside)
-    return t_real + p_out * area_out - p_in * area_in
+    return (t_real + p_out * area_out - p_in * area_in)[()]
 
 
-def tension_real(depth, casing, inside, outside):
+def tension_real(depth, casing, inside, outside, section=None):
     """
     Real tension at depth
 
     :param depth: depth of interest (m)
-    :type depth: float
+    :type depth: float or np.ndarray
     :param casing: casing string specifications object
     :type casing: Casing
     :param inside: fluids column object
     :type inside: fluids.Fluid
     :param outside: fluids column object
     :type outside: fluids.Fluid
+    :param section: casing section index for each depth; by default the section containing the depth
+    :type section: int or np.ndarray
     :return: T_real (N)
-    :rtype: float
+    :rtype: float or np.ndarray
     """
 
-    if depth > units.to_si(total_depth, depth_unit):
+    depth = np.asarray(depth, dtype=float)
+    if np.any(depth > units.to_si(total_depth, depth_unit)):
         mylogging.alglog.info('Tubulars: Depth is greater than TD.')
         raise ValueError('Tubulars: Depth is greater than TD.')
 
-    if depth < 0:
+    if np.any(depth < 0):
         mylogging.alglog.info('Tubulars: Depth is less than 0.')
         raise ValueError('Tubulars: Depth is greater than TD.')
 
+    t_bottom, bottom = section_tension(casing, inside, outside)
+    if section is None:
+        section = np.searchsorted(np.asarray(casing.top[1:], dtype=float), depth, side='right')
+    return (t_bottom[section] + (bottom[section] - depth) * np.asarray(casing.wpf, dtype=float)[section] *
+            units.to_si(1, 'gn'))[()]
+
+
+def section_tension(casing, inside, outside):
+    """
+    Real tension at the bottom of every casing section, accumulated once from TD upward.
+    The pressure-area step at each casing top and the weight of each section below are summed in order.
+
+    :param casing: casing string specifications object
+    :type casing: Casing
+    :param inside: fluids column object
+    :type inside: fluids.Fluid
+    :param outside: fluids column object
+    :type outside: fluids.Fluid
+    :return: T_real at the bottom of each section (N), bottom depth of each section (m)
+    :rtype: tuple
+    """
+
+    top = np.asarray(casing.top, dtype=float)
+    od, id = np.asarray(casing.od, dtype=float), np.asarray(casing.id, dtype=float)
+    wpf = np.asarray(casing.wpf, dtype=float)
     td = units.to_si(total_depth, depth_unit)
-    t_real = - units.to_si(slack_off, weight_unit) \
-             + fluids.pressure_single(td, inside) * area(casing.id[-1]) \
-             - fluids.pressure_single(td, outside) * area(casing.od[-1])
+    gn = units.to_si(1, 'gn')
+    bottom = np.append(top[1:], td)
 
-    if depth >= casing.top[-1]:
-        t_real += (td - depth) * casing.wpf[-1] * units.to_si(1, 'gn')
-        return t_real
+    t_td = - units.to_si(slack_off, weight_unit) \
+        + fluids.pressure_single(td, inside) * area(id[-1]) \
+        - fluids.pressure_single(td, outside) * area(od[-1])
 
-    t_real += (td - casing.top[-1]) * casing.wpf[-1] * units.to_si(1, 'gn')
+    # Terms in the order they are met from TD upward: T(TD), bottom section weight, then per casing top the
+    # pressure-area step and the weight of the section above it
+    step = fluids.pressure_single(top[1:], inside) * (area(id[:-1]) - area(id[1:])) \
+        - fluids.pressure_single(top[1:], outside) * (area(od[:-1]) - area(od[1:]))
+    weight = (bottom - top) * wpf * gn
+    terms = np.empty(2 * len(top))
+    terms[0], terms[1] = t_td, weight[-1]
+    terms[2::2], terms[3::2] = step[::-1], weight[-2::-1]
+    cumulative = np.cumsum(terms)
 
-    i = 1
-    while True:
-        t_real += fluids.pressure_single(casing.top[::-1][i - 1], inside) * (area(casing.id[::-1][i]) - area(casing.id[::-1][i - 1])) \
-                  - fluids.pressure_single(casing.top[::-1][i - 1], outside) * (area(casing.od[::-1][i]) - area(casing.od[::-1][i - 1]))
-        if casing.top[::-1][i - 1] > depth >= casing.top[::-1][i]:
-            t_real += (casing.top[::-1][i - 1] - depth) * casing.wpf[::-1][i] * units.to_si(1, 'gn')
-            return t_real
-        else:
-            t_real += (casing.top[::-1][i - 1] - casing.top[::-1][i]) * casing.wpf[::-1][i] * units.to_si(1, 'gn')
-            i += 1
+    t_bottom = np.empty(len(top))
+    t_bottom[-1] = t_td
+    t_bottom[:-1] = cumulative[2::2][::-1]
+    return t_bottom, bottom
 
 
 def area(diameter):
@@ -97,6 +143,9 @@ def area(diameter):
 
 
 class Casing:
+    __columns = {'Top': (float, True), 'OD': (float, False), 'ID': (float, True), 'WPF': (float, True),
+                 'Grade': (str, True), 'Connection': (str, True)}
+
     def __init__(self, defined=True, path=root + '/Data/Casing/Casing.csv'):
         self.defined = defined
         self.file = path
@@ -109,7 +158,10 @@ class Casing:
         self.connection = None
         self.cost = None
 
-        if defined is True:
+        if defined is True and self.file.endswith('.npz'):
+            self.get_package_data(self.file)
+            mylogging.runlog.info('Casing: Populate Casing object from well package.')
+        elif defined is True:
             try:
                 self.get_casing_data(self.file)
             except KeyError:
@@ -117,93 +169,27 @@ class Casing:
             else:
                 mylogging.runlog.info('Casing: Populate Casing object from file.')
 
-    def get_casing_data(self, file):
-        with open(self.file, 'r') as f:
-            reader = csv.reader(f)
-            lines = list(reader)
-
-        def entry_index(entry, file_lines, column=False):
-            entry_matches = list()
-            matches = read.find(entry, file_lines)
-            [entry_matches.append(match) for match in matches]
-            if column is False:
-                return entry_matches.pop(0)[0]
-            else:
-                return entry_matches.pop(0)
-
-        def depth_entry(index):
-            values = list()
-            for i in range(index[0] + 2, len(lines)):
-                try:
-                    values.append(float(lines[i][index[1]]))
-                except ValueError:
-                    values.append(lines[i][index[1]])
-            return values, lines[index[0] + 1][index[1]]
+    def get_package_data(self, file):
+        _, casing, _ = wellpackage.read(file)
+        for field in ('top', 'od', 'id', 'wpf', 'yp'):
+            setattr(self, field, casing[field].copy())
+        self.grade = tuple(str(value) for value in casing['grade'])
+        self.connection = [str(value) for value in casing['connection']]
 
-        try:
-            index = entry_index('Top', lines, column=True)
-        except IndexError:
-            mylogging.runlog.info('Read: Missing {0}.'.format('fluid top data'))
-            print('Read: Missing {0}.'.format('fluid top data'))
-            self.closed = True
-        else:
-            values, unit = depth_entry(index)
-            values = units.to_si(values, unit)
-            self.top = values
+    def get_casing_data(self, file):
+        _, table = read.read_table(self.file, self.__columns)
 
+        self.top = table['Top'][0]
+        self.id = table['ID'][0]
+        self.wpf = table['WPF'][0]
         try:
-            index = entry_index('OD', lines, column=True)
-        except IndexError:
-            mylogging.runlog.exception('Read: Missing {0}, assumed {1} {2}.'.format('OD data', hole_size, diameter_unit))
+            self.od = table['OD'][0]
+        except KeyError:
+            mylogging.runlog.info('Read: Missing {0}, assumed {1} {2}.'.format('OD data', hole_size, diameter_unit))
             print('Read: Missing {0}, assumed {1} {2}.'.format('OD data', hole_size, diameter_unit))
-            self.od = list()
-            [self.od.append(units.to_si(hole_size, diameter_unit)) for i in range(len(self.top))]
-        else:
-            values, unit = depth_entry(index)
-            values = units.to_si(values, unit)
-            self.od = values
-
-        try:
-            index = entry_index('ID', lines, column=True)
-        except IndexError:
-            mylogging.runlog.exception('Read: Missing {0}.'.format('ID data'))
-            print('Read: Missing {0}.'.format('ID data'))
-        else:
-            values, unit = depth_entry(index)
-            values = units.to_si(values, unit)
-            self.id = values
+            self.od = np.full(len(self.top), units.to_si(hole_size, diameter_unit))
 
-        try:
-            index = entry_index('WPF', lines, column=True)
-        except IndexError:
-            mylogging.runlog.error('Read: Missing {0}.'.format('weight per foot data'))
-            print('Read: Missing {0}.'.format('weight per foot data'))
-            raise KeyError('Read: Missing {0}.'.format('weight per foot data'))
-        else:
-            values, unit = depth_entry(index)
-            values = units.to_si(values, unit)
-            self.wpf = values
-
-        try:
-            index = entry_index('Grade', lines, column=True)
-        except IndexError:
-            mylogging.runlog.error('Read: Missing {0}.'.format('yield point data'))
-            print('Read: Missing {0}.'.format('yield point data'))
-            raise KeyError('Read: Missing {0}.'.format('yield point data'))
-        else:
-            values, unit = depth_entry(index)
-            self.grade = tuple(values)
-            yp = list()
-            for grade in values:
-                yp.append(units.to_si(float(grade.split('-')[1]) * 1000, unit))
-            self.yp = yp
-
-        try:
-            index = entry_index('Connection', lines, column=True)
-        except IndexError:
-            mylogging.runlog.error('Read: Missing {0}.'.format('connection data'))
-            print('Read: Missing {0}.'.format('connection data'))
-            raise KeyError('Read: Missing {0}.'.format('connection data'))
-        else:
-            values, unit = depth_entry(index)
-            self.connection = values
+        grade, unit = table['Grade']
+        self.grade = grade
+        self.yp = units.to_si(np.array([float(value.split('-')[1]) * 1000 for value in grade]), unit)
+        self.connection = list(table['Connection'][0])
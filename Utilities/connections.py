@@ -0,0 +1,103 @@
+"""
+This module provides a shared pool of SQLite connections, read-only unless asked otherwise.
+
+One connection is kept per database file per thread, so lookups never reconnect and the pool is safe to use from
+a thread pool. Connections are opened through a URI with mode=ro (and immutable=1 for the shipped reference
+databases), use memory-mapped pages, and keep the sqlite3 prepared statement cache of every query they run.
+Writable connections (mode=rwc, for the scenario library and the results store) create the file if needed and use
+write-ahead logging, so readers in other processes are not blocked while a batch is written.
+Connections are never carried across a fork; a child process opens its own on first use.
+"""
+
+from Utilities import mylogging
+from urllib.request import pathname2url
+import sqlite3
+import threading
+import os
+
+__local = threading.local()
+
+
+def connect(file=None, immutable=True, mmap_size=64 * 1024 * 1024, statements=256, writable=False):
+    """
+    Connection to a database file, shared by all calls from the current thread
+
+    :param file: database file path
+    :type file: str
+    :param immutable: the file never changes while the process runs (skips locking and change detection)
+    :type immutable: bool
+    :param mmap_size: memory-mapped I/O size (bytes)
+    :type mmap_size: int
+    :param statements: number of prepared statements cached on the connection
+    :type statements: int
+    :param writable: read-write connection, creating the file if it does not exist; immutable is ignored
+    :type writable: bool
+    :return: pooled connection
+    :rtype: sqlite3.Connection
+    """
+
+    if file is None:
+        mylogging.runlog.error('DATABASE: Missing file input.')
+        raise FileNotFoundError('DATABASE: Missing file input.')
+
+    if getattr(__local, 'pid', None) != os.getpid():
+        __local.pid = os.getpid()
+        __local.connections = dict()
+
+    file = os.path.abspath(file)
+    key = (file, 'rw' if writable is True else immutable)
+    try:
+        return __local.connections[key]
+    except KeyError:
+        pass
+
+    if writable is False and os.path.isfile(file) is False:
+        mylogging.runlog.error('DATABASE: {0} does not exist.'.format(file))
+        raise FileNotFoundError('DATABASE: {0} does not exist.'.format(file))
+
+    mylogging.runlog.info('DATABASE: Opening {0} database.'.format(file))
+    if writable is True:
+        uri = 'file:{0}?mode=rwc'.format(pathname2url(file))
+    else:
+        uri = 'file:{0}?mode=ro{1}'.format(pathname2url(file), '&immutable=1' if immutable else '')
+    try:
+        conn = sqlite3.connect(uri, uri=True, cached_statements=statements)
+    except sqlite3.Error:
+        mylogging.runlog.error('DATABASE: Database interface error.')
+        raise sqlite3.InterfaceError('DATABASE: Database interface error.')
+
+    conn.execute('PRAGMA mmap_size={0}'.format(int(mmap_size)))
+    if writable is True:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+    __local.connections[key] = conn
+    mylogging.runlog.info('DATABASE: Database {0} opened.'.format(file))
+    return conn
+
+
+def query(file, statement, parameters=(), immutable=True):
+    """
+    Runs a query on the pooled connection of the database
+
+    :param file: database file path
+    :type file: str
+    :param statement: SQL statement
+    :type statement: str
+    :param parameters: statement parameters
+    :type parameters: list or tuple
+    :param immutable: the file never changes while the process runs
+    :type immutable: bool
+    :return: all rows
+    :rtype: list
+    """
+
+    return connect(file, immutable=immutable).execute(statement, parameters).fetchall()
+
+
+def close():
+    """Closes every connection the current thread holds."""
+    for conn in getattr(__local, 'connections', dict()).values():
+        conn.close()
+    __local.connections = dict()
+    mylogging.runlog.info('DATABASE: Database connections closed.')
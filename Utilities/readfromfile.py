@@ -1,6 +1,5 @@
-from Utilities import mylogging, unitconverter as units
+from Utilities import mylogging, connections, unitconverter as units
 from config import *
-import sqlite3
 import csv
 import numpy as np
 import os
@@ -11,7 +10,7 @@ def get_scenarios(path=root + '/Data/Scenario/'):
     scenario_paths, scenario_names = list(), list()
 
     for directory in os.walk(path):
-        if directory[0] is not path:
+        if os.path.normpath(directory[0]) != os.path.normpath(path):
             scenario_paths.append(directory[0])
             scenario_names.append(directory[0].split('/')[-1])
     return scenario_names, scenario_paths
@@ -26,6 +25,74 @@ def find(header, listoflists):
         yield i, j
 
 
+def read_table(file, columns, keys=()):
+    """
+    Reads a CSV input file in one pass.
+    Rows before the table hold single values as name, value, unit. The table starts at the first row holding one of
+    the column headers, followed by a units row and one row per entry. Numeric columns are parsed and converted to SI
+    with one call per column. Every schema error in the file is logged, then all of them are raised together.
+
+    :param file: CSV file path
+    :type file: str
+    :param columns: column header to (type, required), where type is float (converted to SI) or str (kept as text)
+    :type columns: dict
+    :param keys: names of the single value rows
+    :type keys: tuple
+    :return: single values by name as (text, unit); columns by header as (SI array or tuple of text, unit)
+    :rtype: tuple
+    """
+
+    with open(file, 'r', newline='') as f:
+        rows = [[cell.strip() for cell in row] for row in csv.reader(f)]
+
+    values, table, errors = dict(), dict(), list()
+    header = next((i for i, row in enumerate(rows) if any(cell in columns for cell in row)), len(rows))
+    for row in rows[:header]:
+        if len(row) > 1 and row[0] in keys:
+            values[row[0]] = (row[1], row[2] if len(row) > 2 else None)
+
+    names = rows[header] if header < len(rows) else list()
+    unit_row = rows[header + 1] if header + 1 < len(rows) else list()
+    body = [(i + 1, row) for i, row in enumerate(rows) if i >= header + 2 and any(row)]
+    for j, name in enumerate(names):
+        if name not in columns:
+            continue
+        unit = unit_row[j] if j < len(unit_row) else ''
+        cells = [row[j] if j < len(row) else '' for _, row in body]
+        if columns[name][0] is not float:
+            table[name] = (tuple(cells), unit)
+            continue
+        try:
+            column = np.array(cells, dtype=float)
+        except ValueError:
+            bad = [line for (line, _), cell in zip(body, cells) if not __number(cell)]
+            errors.append('{0} is not numeric on rows {1}'.format(name, ', '.join(str(k) for k in bad)))
+            continue
+        try:
+            table[name] = (units.to_si(column, unit), unit)
+        except KeyError:
+            errors.append('{0} has an unknown unit "{1}"'.format(name, unit))
+
+    missing = [name for name, (kind, required) in columns.items() if required is True and name not in names]
+    if len(missing) > 0:
+        errors.insert(0, 'missing {0}'.format(', '.join(missing)))
+    if len(errors) > 0:
+        message = 'Read: {0}: {1}.'.format(file, '; '.join(errors))
+        mylogging.runlog.error(message)
+        print(message)
+        raise KeyError(message)
+    return values, table
+
+
+def __number(text):
+    """Whether the text parses as a float."""
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
 def fluid_data(name, inside=True, path=root + '/Data/Scenario/'):
     if inside is True:
         file_path = path + name + '/' + 'PressureInside.csv'
@@ -61,31 +128,11 @@ def get_inventory(connection=None, database=root + '/Data/CasingCatalog.db'):
     :rtype: pd.DataFrame
     """
 
-    try:
-        (cursor, conn) = open_database(database)
-    except FileNotFoundError:
-        raise FileNotFoundError
-    except sqlite3.InterfaceError:
-        raise FileNotFoundError
-
-    if connection == 'STC':
-        cursor.execute('SELECT * FROM Inventory WHERE Conn=?', ['STC'])
-    elif connection == 'LTC':
-        cursor.execute('SELECT * FROM Inventory WHERE Conn=?', ['LTC'])
-    elif connection == 'BTC':
-        cursor.execute('SELECT * FROM Inventory WHERE Conn=?', ['BTC'])
+    # The catalog is user-edited, so it is not opened as immutable
+    if connection in ('STC', 'LTC', 'BTC'):
+        inventory = connections.query(database, 'SELECT * FROM Inventory WHERE Conn=?', [connection], immutable=False)
     else:
-        cursor.execute('SELECT * FROM Inventory')
-
-
-    try:
-        inventory = cursor.fetchall()
-    except IndexError:
-        print('DATABASE: Coupling does not exist in API 5B.')
-        close_database(cursor, conn)
-        raise IndexError('DATABASE: Coupling does not exist in API 5B.')
-    else:
-        close_database(cursor, conn)
+        inventory = connections.query(database, 'SELECT * FROM Inventory', immutable=False)
 
     df = pd.DataFrame(inventory, columns=['OD', 'WPF', 'Grade', 'Connection', 'ID', 'DriftID', 'Cost'])
     YP = list()
@@ -100,26 +147,3 @@ def get_inventory(connection=None, database=root + '/Data/CasingCatalog.db'):
     df.WPF = units.to_si(df.WPF, 'lbm/ft')
     df.Cost = units.from_si(df.Cost, 'ft')
     return df
-
-
-def open_database(file=None):
-    if file is None:
-        mylogging.runlog.error('DATABASE: Missing file input.')
-        raise FileNotFoundError('DATABASE: Missing file input.')
-
-    mylogging.runlog.info('DATABASE: Opening {0} database.'.format(file))
-    try:
-        conn = sqlite3.connect(file)
-    except sqlite3.InterfaceError:
-        mylogging.runlog.error('DATABASE: Database interface error.')
-        raise sqlite3.InterfaceError
-    else:
-        cursor = conn.cursor()
-        mylogging.runlog.info('DATABASE: Database {0} opened.'.format(file))
-        return cursor, conn
-
-
-def close_database(cursor, conn):
-    cursor.close()
-    conn.close()
-    mylogging.runlog.info('DATABASE: Database closed.')
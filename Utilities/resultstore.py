@@ -0,0 +1,205 @@
+"""
+Results store: envelopes, governing scenarios and minimum safety factors of many wells in one SQLite database.
+
+Each well is written in one transaction. Its per-depth envelopes (loads and strengths over the depth grid) are
+stored as byte-shuffled, zlib compressed float64 blobs, one row per column, so a well costs a few dozen rows whatever
+its grid size; a coarser depth grid (grid_tolerance) shrinks the blobs in proportion. The governing scenario runs are
+stored as rows. The safety factors are summarized as rows too: the minimum of each mode over every run of one
+governing scenario, split at fixed depth intervals. The summary is indexed by mode and safety factor, so a field query
+such as every well with a collapse SF below 1.2 under 8,000 ft reads the index. Only the summary rows that straddle
+the depth range are checked against the stored envelope.
+"""
+
+from Utilities import connections, mylogging
+import numpy as np
+import zlib
+
+__schema = ('CREATE TABLE IF NOT EXISTS Well (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, run TEXT)',
+            'CREATE TABLE IF NOT EXISTS Envelope (well INTEGER NOT NULL REFERENCES Well (id) ON DELETE CASCADE, '
+            'name TEXT NOT NULL, data BLOB NOT NULL, PRIMARY KEY (well, name)) WITHOUT ROWID',
+            'CREATE TABLE IF NOT EXISTS Governing (well INTEGER NOT NULL REFERENCES Well (id) ON DELETE CASCADE, '
+            'mode TEXT NOT NULL, top REAL NOT NULL, base REAL NOT NULL, scenario TEXT NOT NULL, '
+            'PRIMARY KEY (well, mode, top)) WITHOUT ROWID',
+            'CREATE TABLE IF NOT EXISTS Safety (well INTEGER NOT NULL REFERENCES Well (id) ON DELETE CASCADE, '
+            'mode TEXT NOT NULL, top REAL NOT NULL, base REAL NOT NULL, sf REAL NOT NULL, md REAL NOT NULL, '
+            'scenario TEXT NOT NULL, PRIMARY KEY (well, mode, top)) WITHOUT ROWID',
+            'CREATE INDEX IF NOT EXISTS SafetyMode ON Safety (mode, sf)')
+
+# Safety factor mode: strength column, load column and the governing runs it is summarized over
+__modes = {'burst': ('strength_burst', 'burst', 'burst'),
+           'collapse': ('strength_collapse_biax', 'collapse', 'collapse'),
+           'tension': ('strength_tensile', 'tension', 'tension'),
+           'joint': ('strength_joint', 'tension', 'tension')}
+__envelopes = ('md', 'burst', 'collapse', 'tension', 'vonmises', 'yp', 'ypadj', 'strength_burst', 'strength_collapse',
+               'strength_collapse_biax', 'strength_tensile', 'strength_joint')
+
+
+def write(file, wells, interval=500.):
+    """
+    Adds wells to the store, one transaction per well. A well already in the store (same name) is replaced.
+
+    :param file: store file path, created if needed
+    :type file: str
+    :param wells: (name, master, scenarios) of each well, or (name, master, scenarios, run key)
+    :type wells: iterable
+    :param interval: largest depth span of a safety factor summary row (ft)
+    :type interval: float
+    :return: number of wells written
+    :rtype: int
+    """
+
+    conn = connections.connect(file, writable=True)
+    with conn:
+        for statement in __schema:
+            conn.execute(statement)
+
+    count = 0
+    for well in wells:
+        name, master, scenarios = well[:3]
+        run = well[3] if len(well) > 3 else None
+        envelopes, governing, safety = __rows(master, scenarios, interval)
+        with conn:
+            i = conn.execute('INSERT INTO Well (name, run) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET '
+                             'run = excluded.run RETURNING id', (name, run)).fetchone()[0]
+            conn.execute('DELETE FROM Governing WHERE well = ?', (i,))
+            conn.execute('DELETE FROM Safety WHERE well = ?', (i,))
+            conn.executemany('INSERT OR REPLACE INTO Envelope VALUES (?, ?, ?)',
+                             [(i, column, __pack(values)) for column, values in envelopes.items()])
+            conn.executemany('INSERT INTO Governing VALUES (?, ?, ?, ?, ?)', [(i,) + row for row in governing])
+            conn.executemany('INSERT INTO Safety VALUES (?, ?, ?, ?, ?, ?, ?)', [(i,) + row for row in safety])
+        count += 1
+    mylogging.runlog.info('Results: {0} wells written to {1}.'.format(count, file))
+    return count
+
+
+def read(file, well):
+    """
+    Stored results of one well
+
+    :param file: store file path
+    :type file: str
+    :param well: well name
+    :type well: str
+    :return: envelope columns by name (md in ft, loads and strengths in psi and lbf, safety factors as sf_<mode>);
+             governing scenario runs by mode as record arrays of top, base (ft) and scenario, as master.governing
+    :rtype: tuple
+    """
+
+    rows = connections.query(file, 'SELECT e.name, e.data FROM Envelope e JOIN Well w ON w.id = e.well '
+                                   'WHERE w.name = ?', (well,), immutable=False)
+    if len(rows) == 0:
+        mylogging.runlog.error('Results: {0} is not in {1}.'.format(well, file))
+        raise KeyError('Results: {0} is not in {1}.'.format(well, file))
+    envelopes = {column: __unpack(data) for column, data in rows}
+    for mode, (strength, load, _) in __modes.items():
+        envelopes['sf_' + mode] = __safety(envelopes[strength], envelopes[load])
+
+    governing = dict()
+    for mode, top, base, scenario in connections.query(
+            file, 'SELECT g.mode, g.top, g.base, g.scenario FROM Governing g JOIN Well w ON w.id = g.well '
+                  'WHERE w.name = ? ORDER BY g.mode, g.top', (well,), immutable=False):
+        governing.setdefault(mode, list()).append((top, base, scenario))
+    governing = {mode: np.rec.fromrecords(runs, names=('top', 'base', 'scenario')) for mode, runs in governing.items()}
+    return envelopes, governing
+
+
+def select(file, mode='collapse', below=1., top=0., base=np.inf):
+    """
+    Wells whose safety factor falls below a limit within a depth range, e.g. mode='collapse', below=1.2, top=8000.
+
+    :param file: store file path
+    :type file: str
+    :param mode: burst, collapse, tension or joint
+    :type mode: str
+    :param below: safety factor limit
+    :type below: float
+    :param top: top of the depth range (ft)
+    :type top: float
+    :param base: base of the depth range (ft)
+    :type base: float
+    :return: one record per well, in the order written: well name, depth (ft) and value of its minimum safety factor
+             within the range
+    :rtype: np.recarray
+    """
+
+    if mode not in __modes:
+        mylogging.runlog.error('Results: Unknown safety factor mode {0}.'.format(mode))
+        raise ValueError('Results: Unknown safety factor mode {0}.'.format(mode))
+
+    rows = connections.query(file, 'SELECT w.id, w.name, s.top, s.base, s.sf, s.md FROM Safety s '
+                                   'JOIN Well w ON w.id = s.well WHERE s.mode = ? AND s.sf < ? AND s.base >= ? '
+                                   'AND s.top <= ? ORDER BY w.id, s.top', (mode, below, top, base), immutable=False)
+
+    found = dict()
+    for i, name, start, stop, sf, md in rows:
+        if not top <= md <= base:
+            # The summary row straddles the range and its minimum lies outside: check the depths within the range
+            md, sf = __refine(file, i, mode, top, base)
+            if not sf < below:
+                continue
+        if i not in found or sf < found[i][2]:
+            found[i] = (name, md, sf)
+    return np.rec.fromrecords(list(found.values()), names=('well', 'md', 'sf')) if len(found) > 0 else \
+        np.rec.fromarrays([np.zeros(0, dtype=str), np.zeros(0), np.zeros(0)], names=('well', 'md', 'sf'))
+
+
+def __refine(file, well, mode, top, base):
+    """Depth and value of the smallest safety factor of a mode within a depth range, from the stored envelope."""
+    strength, load, _ = __modes[mode]
+    envelopes = {column: __unpack(data) for column, data in connections.query(
+        file, 'SELECT name, data FROM Envelope WHERE well = ? AND name IN (?, ?, ?)', (well, 'md', strength, load),
+        immutable=False)}
+    md, sf = envelopes['md'], __safety(envelopes[strength], envelopes[load])
+    inside = np.flatnonzero((md >= top) & (md <= base))
+    if len(inside) == 0:
+        return np.nan, np.inf
+    k = inside[np.argmin(sf[inside])]
+    return md[k], sf[k]
+
+
+def __pack(values):
+    """Compressed float64 column. Bytes of equal significance are grouped first, which compresses smooth data better."""
+    return zlib.compress(np.ascontiguousarray(values.view(np.uint8).reshape(-1, 8).T).tobytes(), 1)
+
+
+def __unpack(data):
+    """Float64 column from __pack."""
+    return np.ascontiguousarray(np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(8, -1).T).view('<f8')[:, 0]
+
+
+def __safety(strength, load):
+    """Strength over load at each depth; infinite where there is no load or the load or strength is unknown (NaN)."""
+    sf = np.full(len(load), np.inf)
+    np.divide(strength, load, out=sf, where=load > 0)
+    sf[np.isnan(sf)] = np.inf
+    return sf
+
+
+def __rows(master, scenarios, interval):
+    """Envelope columns, governing run rows and safety factor summary rows of one well."""
+    tension = [scenario.treal for scenario in scenarios if scenario.scenario == 'Tensile']
+    columns = {column: getattr(master, column) for column in __envelopes if column != 'tension'}
+    columns['tension'] = np.max(np.stack(tension), axis=0) if len(tension) > 0 else np.zeros(len(master.md))
+    envelopes = {column: np.ascontiguousarray(values, dtype='<f8') for column, values in columns.items()}
+
+    md = envelopes['md']
+    governing = [(mode,) + run for mode, runs in master.governing.items()
+                 for run in zip(runs['top'].tolist(), runs['base'].tolist(), runs['scenario'].tolist())]
+
+    safety = list()
+    for mode, (strength, load, governs) in __modes.items():
+        sf = __safety(envelopes[strength], envelopes[load])
+
+        # Summary rows: runs of one governing scenario, split where the depth crosses a multiple of interval
+        runs = master.governing[governs]
+        run = np.searchsorted(runs['top'], md, side='right') - 1
+        start = np.flatnonzero((np.diff(run, prepend=-1) != 0) | (np.diff(np.floor(md / interval), prepend=-1) != 0))
+        stop = np.append(start[1:], len(md))
+        lowest = np.minimum.reduceat(sf, start)
+        segment = np.repeat(np.arange(len(start)), stop - start)
+        hit = np.flatnonzero(sf == lowest[segment])
+        first = hit[np.unique(segment[hit], return_index=True)[1]]
+        assert len(first) == len(start), 'every summary row has its minimum depth'
+        safety.extend(zip([mode] * len(start), md[start].tolist(), md[stop - 1].tolist(), lowest.tolist(),
+                          md[first].tolist(), runs['scenario'][run[start]].tolist()))
+    return envelopes, governing, safety
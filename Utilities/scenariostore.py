@@ -0,0 +1,122 @@
+"""
+Scenario library: load cases shared by many wells, kept in one SQLite database.
+
+Each scenario is a row keyed by its type (Burst, Collapse or Tensile) and name, with any number of tags. Its inside
+and outside fluid columns are stored as float64 blobs in SI units, together with the surface pressure and the closed
+flag. Type, name and tag are indexed, so a selection such as every Burst scenario tagged gas-well is one indexed
+query. algorithm.get_scenarios takes a library path (.db) in place of the scenario directory, and
+algorithm.import_scenarios fills a library from the directory layout.
+"""
+
+from Utilities import connections, mylogging
+import numpy as np
+
+__schema = ('CREATE TABLE IF NOT EXISTS Scenario (id INTEGER PRIMARY KEY, type TEXT NOT NULL, name TEXT NOT NULL, '
+            'source TEXT, UNIQUE (type, name))',
+            'CREATE INDEX IF NOT EXISTS ScenarioName ON Scenario (name)',
+            'CREATE TABLE IF NOT EXISTS Fluid (scenario INTEGER NOT NULL REFERENCES Scenario (id) ON DELETE CASCADE, '
+            'inside INTEGER NOT NULL, surface_pressure REAL NOT NULL, closed INTEGER NOT NULL, top BLOB NOT NULL, '
+            'density BLOB NOT NULL, PRIMARY KEY (scenario, inside)) WITHOUT ROWID',
+            'CREATE TABLE IF NOT EXISTS Tag (tag TEXT NOT NULL, scenario INTEGER NOT NULL REFERENCES Scenario (id) '
+            'ON DELETE CASCADE, PRIMARY KEY (tag, scenario)) WITHOUT ROWID',
+            'CREATE INDEX IF NOT EXISTS TagScenario ON Tag (scenario)')
+
+
+def write(file, scenarios, tags=(), source=None):
+    """
+    Adds scenarios to the library in one transaction. A scenario already in the library (same type and name) has
+    its fluid columns replaced and keeps its tags; the new tags are added to every scenario written.
+
+    :param file: library file path
+    :type file: str
+    :param scenarios: scenarios list
+    :type scenarios: list
+    :param tags: tags of the scenarios
+    :type tags: tuple
+    :param source: where the scenarios come from, e.g. their directory
+    :type source: str
+    """
+
+    conn = connections.connect(file, writable=True)
+    with conn:
+        for statement in __schema:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO Scenario (type, name, source) VALUES (?, ?, ?) '
+                         'ON CONFLICT (type, name) DO UPDATE SET source = excluded.source',
+                         [(scenario.scenario, scenario.name, source) for scenario in scenarios])
+        ids = [conn.execute('SELECT id FROM Scenario WHERE type = ? AND name = ?',
+                            (scenario.scenario, scenario.name)).fetchone()[0] for scenario in scenarios]
+
+        conn.executemany('INSERT OR REPLACE INTO Fluid VALUES (?, ?, ?, ?, ?, ?)',
+                         [(i, int(inside), float(fluid.surface_pressure), int(bool(fluid.closed)),
+                           np.asarray(fluid.top, dtype='<f8').tobytes(),
+                           np.asarray(fluid.density, dtype='<f8').tobytes())
+                          for i, scenario in zip(ids, scenarios)
+                          for inside, fluid in ((True, scenario.fluid_in), (False, scenario.fluid_out))])
+        conn.executemany('INSERT OR IGNORE INTO Tag VALUES (?, ?)', [(tag, i) for i in ids for tag in tags])
+    mylogging.runlog.info('Library: {0} scenarios written to {1}.'.format(len(scenarios), file))
+
+
+def tag(file, scenario, name, tags):
+    """
+    Adds tags to one scenario of the library
+
+    :param file: library file path
+    :type file: str
+    :param scenario: scenario type
+    :type scenario: str
+    :param name: scenario name
+    :type name: str
+    :param tags: tags to add
+    :type tags: tuple
+    """
+
+    conn = connections.connect(file, writable=True)
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO Tag SELECT ?, id FROM Scenario WHERE type = ? AND name = ?',
+                         [(value, scenario, name) for value in tags])
+
+
+def select(file, scenario=None, name=None, tags=()):
+    """
+    Scenarios of the library matching every criterion given, in the order they were added
+
+    :param file: library file path
+    :type file: str
+    :param scenario: scenario type (Burst, Collapse or Tensile)
+    :type scenario: str
+    :param name: scenario name
+    :type name: str
+    :param tags: tags the scenarios must all have
+    :type tags: tuple
+    :return: per scenario type, name and the inside and outside fluid records (top, density in SI, surface_pressure,
+             closed), as in wellpackage.read
+    :rtype: list
+    """
+
+    # Each distinct tag is counted once per scenario, so repeated tags must not raise the count asked for
+    tags = tuple(dict.fromkeys((tags,) if isinstance(tags, str) else tags))
+    where, parameters = list(), list()
+    if scenario is not None:
+        where.append('s.type = ?')
+        parameters.append(scenario)
+    if name is not None:
+        where.append('s.name = ?')
+        parameters.append(name)
+    if len(tags) > 0:
+        where.append('s.id IN (SELECT scenario FROM Tag WHERE tag IN ({0}) GROUP BY scenario HAVING COUNT(*) = ?)'
+                     .format(', '.join('?' * len(tags))))
+        parameters.extend(tags + (len(tags),))
+
+    statement = 'SELECT s.id, s.type, s.name, f.inside, f.surface_pressure, f.closed, f.top, f.density ' \
+                'FROM Scenario s JOIN Fluid f ON f.scenario = s.id {0} ORDER BY s.id, f.inside DESC' \
+        .format('WHERE ' + ' AND '.join(where) if len(where) > 0 else '')
+
+    records = dict()
+    for i, kind, label, inside, pressure, closed, top, density in \
+            connections.query(file, statement, parameters, immutable=False):
+        record = records.setdefault(i, {'type': kind, 'name': label})
+        record['inside' if inside else 'outside'] = {'surface_pressure': pressure, 'closed': bool(closed),
+                                                     'top': np.frombuffer(top, dtype='<f8'),
+                                                     'density': np.frombuffer(density, dtype='<f8')}
+    return list(records.values())
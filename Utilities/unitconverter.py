@@ -6,8 +6,11 @@ http://www.energistics.org/asset-data-management/unit-of-measure-standard
 """
 
 from Utilities import mylogging
-from lxml import etree
-import pkg_resources
+from xml.etree import ElementTree
+import hashlib
+import json
+import os
+import tempfile
 try:
     import numpy as np
 except:
@@ -16,35 +19,87 @@ else:
     __numpyEnabled = True
 
 
-# Load Energistics symbols and factors
-resource_package = __name__
-xmlFile = pkg_resources.resource_string(resource_package, "/units.xml")
-root = etree.fromstring(xmlFile)
-
-tag = etree.QName('http://www.energistics.org/energyml/data/uomv1', 'unit')
+# Energistics symbols and factors; the parsed registry is cached next to units.xml and keyed by its hash
+__xml = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'units.xml')
+__cache = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'units.json')
+__namespace = '{http://www.energistics.org/energyml/data/uomv1}'
 __units = {}
-for unitXml in root.iter(tag.text):
-    unit = {}
-    isBase = False
-    for field in unitXml:
-        t = etree.QName(field.tag)
+__factors = {}
+__converters = {}
+
+
+def _parse_unit(element):
+    """
+    Symbol, base unit and conversion factors of one unit element of units.xml
 
+    :param element: unit element
+    :type element: ElementTree.Element
+    :return: unit fields
+    :rtype: dict
+    """
+    unit = {}
+    for field in element:
+        name = field.tag.split('}')[-1]
         try:
-            unit[t.localname] = float(eval(field.text.replace("PI", "np.pi")))
+            unit[name] = float(eval(field.text.replace("PI", "np.pi")))
         except:
-            unit[t.localname] = field.text
+            unit[name] = field.text
 
-        if t.localname=="isBase":
+        if name == "isBase":
             unit["baseUnit"] = unit["symbol"]
             unit["A"] = 0.0
             unit["B"] = 1.0
             unit["C"] = 1.0
+    return unit
+
+
+def load():
+    """
+    Loads the unit registry from the cache when it matches the hash of units.xml; otherwise parses units.xml and
+    refreshes the cache. The factors and converters memoized from the previous registry are dropped.
+    """
+    global __units
+    __factors.clear()
+    __converters.clear()
+    with open(__xml, 'rb') as f:
+        xml = f.read()
+    key = hashlib.sha1(xml).hexdigest()
+
+    try:
+        with open(__cache, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = dict()
+    if cache.get('hash') == key:
+        __units = cache['units']
+        return
+
+    __units = {}
+    for element in ElementTree.fromstring(xml).iter(__namespace + 'unit'):
+        unit = _parse_unit(element)
+        __units[unit["symbol"]] = unit
+
+    # Each process writes its own temporary file, so processes starting together never interleave their writes
+    try:
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(__cache), suffix='.tmp')
+    except OSError:
+        mylogging.runlog.info('Units: Unable to write the unit cache {0}.'.format(__cache))
+        return
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump({'hash': key, 'units': __units}, f)
+        os.replace(temporary, __cache)
+    except OSError:
+        mylogging.runlog.info('Units: Unable to write the unit cache {0}.'.format(__cache))
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
 
-    __units[unit["symbol"]] = unit
+load()
 
 
 def isUnit(symbol):
-    if symbol not in __units.keys():
+    if symbol not in __units:
         mylogging.runlog.error('Units: {0} is not a valid unit symbol.'.format(symbol))
         raise ValueError('Units: {0} is not a valid unit symbol.'.format(symbol))
 
@@ -62,7 +117,7 @@ def add_custom_unit(symbol, name, base_unit, a, b, c, d=0):
     Set the force flag to True to force an override of existing symbol
     """
     # global units
-    if symbol not in __units.keys():
+    if symbol not in __units:
         __units[symbol] = {'symbol': symbol, 'name': name, "baseUnit": base_unit, "A": a, "B": b, "C": c, "D": d}
 
 
@@ -70,34 +125,84 @@ def base_unit(source_unit):
     return __units[source_unit]['baseUnit']
 
 
-def from_to(value, source_unit, target_unit):
+def factors(symbol):
     """
-    Converts value(s) from a non-SI unit to the desired target_unit
+    Offset and scale to SI of a unit symbol, computed once and cached
 
-    :param value: Value to convert
-    :param source_unit: Source unit symbol
-    :type source_unit: str
-    :param target_unit: Target unit symbol
-    :type target_unit: str
-    :return: The value converted to target_unit
+    :param symbol: unit symbol
+    :type symbol: str
+    :return: offset, scale; value_si = value * scale + offset
+    :rtype: tuple
     """
     try:
-        __units[target_unit]
+        return __factors[symbol]
     except KeyError:
-        mylogging.runlog.info('Units: from_si - ' + str(target_unit) + ' is an incorrect unit symbol.')
-        raise KeyError(str(target_unit) + ' is an incorrect unit symbol.')
+        pass
+
+    try:
+        unit = __units[symbol]
+    except KeyError:
+        mylogging.runlog.info('Units: ' + str(symbol) + ' is an incorrect unit symbol.')
+        raise KeyError(str(symbol) + ' is an incorrect unit symbol.')
+
+    __factors[symbol] = (unit["A"] * 1.0 / unit["C"], unit["B"] * 1.0 / unit["C"])
+    return __factors[symbol]
+
+
+def converter(source_unit=None, target_unit=None):
+    """
+    Compiled unit conversion: a cached callable taking a scalar or an array, with the symbols validated once.
+    None stands for the SI unit, so converter('ft') converts ft to m and converter(None, 'psi') Pa to psi.
+
+    :param source_unit: source unit symbol
+    :type source_unit: str
+    :param target_unit: target unit symbol
+    :type target_unit: str
+    :return: conversion function
+    :rtype: function
+    """
     try:
-        __units[source_unit]
+        return __converters[(source_unit, target_unit)]
     except KeyError:
-        mylogging.runlog.info('Units: to_si - ' + str(source_unit) + ' is an incorrect unit symbol.')
-        raise KeyError(source_unit + ' is an incorrect unit symbol.')
+        pass
+
+    source_offset, source_scale = (0.0, 1.0) if source_unit is None else factors(source_unit)
+    target_offset, target_scale = (0.0, 1.0) if target_unit is None else factors(target_unit)
+    scaled_offset = target_offset / target_scale
 
-    if __units[target_unit]['baseUnit'] != __units[source_unit]['baseUnit']:
+    if source_unit is not None and target_unit is not None and base_unit(source_unit) != base_unit(target_unit):
         mylogging.runlog.error('source_unit ' + str(source_unit) + ' and target_unit ' + str(target_unit) +
-                     ' do not share the same base unit.')
+                               ' do not share the same base unit.')
         raise KeyError('source_unit ' + str(source_unit) + ' and target_unit ' + str(target_unit) +
                        ' do not share the same base unit.')
 
+    if target_unit is None:
+        def convert(value):
+            return np.multiply(value, source_scale) + source_offset
+    elif source_unit is None:
+        def convert(value):
+            return np.divide(value, target_scale) - scaled_offset
+    else:
+        def convert(value):
+            return np.divide(np.multiply(value, source_scale) + source_offset, target_scale) - scaled_offset
+
+    __converters[(source_unit, target_unit)] = convert
+    return convert
+
+
+def from_to(value, source_unit, target_unit):
+    """
+    Converts value(s) from a non-SI unit to the desired target_unit
+
+    :param value: Value to convert
+    :param source_unit: Source unit symbol
+    :type source_unit: str
+    :param target_unit: Target unit symbol
+    :type target_unit: str
+    :return: The value converted to target_unit
+    """
+    if __numpyEnabled:
+        return converter(source_unit, target_unit)(value)
     return from_si(to_si(value, source_unit), target_unit)
 
 
@@ -111,25 +216,15 @@ def from_si(value, target_unit):
     :type target_unit: str
     :return: The value converted to TARGETUNIT
     """
-    try:
-        __units[target_unit]
-    except KeyError:
-        mylogging.runlog.info('Units: from_si - ' + str(target_unit) + ' is an incorrect unit symbol.')
-        raise KeyError(str(target_unit) + ' is an incorrect unit symbol.')
-
-    global __numpyEnabled
-    offset = __units[target_unit]["A"] * 1.0 / __units[target_unit]["C"]
-    scale = __units[target_unit]["B"] * 1.0 / __units[target_unit]["C"]
     if __numpyEnabled:
-        y = np.divide(value, scale) - np.divide(offset, scale)
-    else:
-        scaled_offset = offset / scale
-        if hasattr(value, "__iter__"):
-
-            y = [(v / scale)-scaled_offset for v in value]
-        else:
-            y = value/scale - scaled_offset
+        return converter(None, target_unit)(value)
 
+    offset, scale = factors(target_unit)
+    scaled_offset = offset / scale
+    if hasattr(value, "__iter__"):
+        y = [(v / scale) - scaled_offset for v in value]
+    else:
+        y = value / scale - scaled_offset
     return y
 
 
@@ -143,22 +238,14 @@ def to_si(value, source_unit):
     :type source_unit: str
     :return: The value converted to SI
     """
-    try:
-        __units[source_unit]
-    except KeyError:
-        mylogging.runlog.info('Units: to_si - ' + str(source_unit) + ' is an incorrect unit symbol.')
-        raise KeyError(source_unit + ' is an incorrect unit symbol.')
-
-    global __numpyEnabled
-    offset = __units[source_unit]["A"] * 1.0 / __units[source_unit]["C"]
-    scale = __units[source_unit]["B"] * 1.0 / __units[source_unit]["C"]
     if __numpyEnabled:
-        y = np.multiply(value, scale) + offset
+        return converter(source_unit)(value)
+
+    offset, scale = factors(source_unit)
+    if hasattr(value, "__iter__"):
+        y = [(v * scale) + offset for v in value]
     else:
-        if hasattr(value, "__iter__"):
-            y = [(v * scale) + offset for v in value]
-        else:
-            y = value*scale + offset
+        y = value * scale + offset
     return y
 
 
@@ -0,0 +1,112 @@
+"""
+Well package: one binary file holding a whole well design.
+
+A package is an npz file with the casing sections, the fluid columns of every scenario (all in SI units) and a JSON
+metadata record with the format version, the scenario list and the config the well was packed with. It loads with
+one read, so batch runs do not walk and parse a directory tree per well. tubulars.Casing and algorithm.get_scenarios
+take a package path (.npz) in place of Casing.csv or the scenario directory.
+"""
+
+from Utilities import mylogging
+import config
+import numpy as np
+import json
+import tempfile
+import os
+
+__format = 'casing design well package'
+__version = 1
+__casing = ('top', 'od', 'id', 'wpf', 'yp', 'grade', 'connection')
+__packages = dict()
+
+
+def write(file, casing, scenarios):
+    """
+    Packs a well into one file, written through a temporary file
+
+    :param file: package file path (.npz)
+    :type file: str
+    :param casing: Casing object
+    :type casing: tubulars.Casing
+    :param scenarios: scenarios list
+    :type scenarios: list
+    """
+
+    sections = [np.asarray(getattr(casing, field), dtype=str if field in ('grade', 'connection') else float)
+                for field in __casing]
+    arrays = {'casing': np.rec.fromarrays(sections, names=__casing)}
+
+    # Fluid layers of every scenario and side in one table; the metadata holds the rows of each column
+    listing, top, density = list(), list(), list()
+    for scenario in scenarios:
+        entry = {'type': scenario.scenario, 'name': scenario.name}
+        for side, fluid in (('inside', scenario.fluid_in), ('outside', scenario.fluid_out)):
+            start = sum(len(layers) for layers in top)
+            top.append(np.asarray(fluid.top, dtype=float))
+            density.append(np.asarray(fluid.density, dtype=float))
+            entry[side] = {'rows': [start, start + len(top[-1])], 'surface_pressure': float(fluid.surface_pressure),
+                           'closed': bool(fluid.closed)}
+        listing.append(entry)
+    arrays['fluid'] = np.stack((np.concatenate(top), np.concatenate(density))) if len(top) > 0 else np.zeros((2, 0))
+
+    settings = {name: value for name, value in vars(config).items() if not name.startswith('_') and
+                name not in ('root', 'os') and isinstance(value, (bool, int, float, str, type(None)))}
+    meta = {'format': __format, 'version': __version, 'scenarios': listing, 'config': settings}
+    arrays['meta'] = np.array(json.dumps(meta))
+
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file)), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, file)
+    except OSError:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        mylogging.runlog.error('Package: Unable to write {0}.'.format(file))
+        raise
+    mylogging.runlog.info('Package: {0} scenarios written to {1}.'.format(len(scenarios), file))
+
+
+def read(file):
+    """
+    Contents of a package. The last package read is kept, so building the casing and the scenarios of a well reads
+    its file once.
+
+    :param file: package file path (.npz)
+    :type file: str
+    :return: metadata; casing fields by name (SI); per scenario type, name and the inside and outside fluid records
+             (top, density in SI, surface_pressure, closed)
+    :rtype: tuple
+    """
+
+    stat = os.stat(file)
+    key = (os.path.abspath(file), stat.st_mtime_ns, stat.st_size)
+    try:
+        return __packages[key]
+    except KeyError:
+        pass
+
+    with np.load(file, allow_pickle=False) as f:
+        arrays = {name: f[name] for name in f.files}
+    meta = json.loads(str(arrays['meta']))
+    if meta.get('format') != __format or meta.get('version', 0) > __version:
+        mylogging.runlog.error('Package: {0} is not a version {1} well package.'.format(file, __version))
+        raise ValueError('Package: {0} is not a version {1} well package.'.format(file, __version))
+
+    changed = sorted(name for name, value in meta['config'].items() if getattr(config, name, value) != value)
+    if len(changed) > 0:
+        mylogging.runlog.info('Package: {0} was packed with different {1}.'.format(file, ', '.join(changed)))
+
+    casing = {field: arrays['casing'][field] for field in __casing}
+    top, density = arrays['fluid']
+    scenarios = list()
+    for entry in meta['scenarios']:
+        scenario = {'type': entry['type'], 'name': entry['name']}
+        for side in ('inside', 'outside'):
+            start, stop = entry[side]['rows']
+            scenario[side] = dict(entry[side], top=top[start:stop], density=density[start:stop])
+        scenarios.append(scenario)
+
+    __packages.clear()
+    __packages[key] = (meta, casing, scenarios)
+    return __packages[key]
@@ -9,6 +9,10 @@ burst_backup = 0.465
 min_section = 500
 mop = 100000
 leak_resistance = False
+collapse_table = False  # API 5C3 coefficients and D/t limits from the grade table instead of the formulas
+grid_tolerance = None  # psi; None keeps the 1 ft depth grid
+workers = 1  # scenario evaluation processes; None uses every core
+run_cache_size = 2 ** 28  # bytes of design runs kept in Data/RunCache; 0 disables the cache
 
 # Units
 depth_unit = 'ft'
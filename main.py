@@ -1,5 +1,5 @@
 from Utilities import mylogging, unitconverter as units, readfromfile as read
-from CasingDesign import fluids, tubulars, plot, api, stress, algorithm
+from CasingDesign import fluids, tubulars, plot, api, stress, algorithm, runcache
 from config import *
 from copy import copy
 
@@ -30,30 +30,9 @@ def __init__():
 
 if __name__ == '__main__':
     inventory, casing, scenarios = __init__()
-    for scenario in scenarios:
-        algorithm.update_depth(casing, scenario)
-        algorithm.update_casing(casing, scenario)
 
-    print('Inside and Outside Pressure')
-    algorithm.pressure(scenarios)
-
-    print('Real and Effective Tension')
-    algorithm.tension(scenarios, casing)
-
-    print('Design Eqn')
-    algorithm.burst(scenarios)
-    algorithm.collapse(scenarios)
-
-    print('Stress State')
-    algorithm.stress_state(scenarios)
-    algorithm.yield_pt_adjust(scenarios)
-
-    print('Master Scenario')
-    master = algorithm.Scenario()
-    algorithm.master_scenario(master, scenarios)
-
-    print('Casing Strength')
-    algorithm.casing_strength(master)
+    print('Pressure, Tension, Design Eqn, Stress State, Master Scenario and Casing Strength')
+    master = runcache.evaluate(casing, scenarios, workers=workers)
 
     print('Plots')
     plot.burst(scenarios, master)